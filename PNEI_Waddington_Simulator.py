@@ -1,7 +1,10 @@
 import streamlit as st
 import numpy as np
-import plotly.graph_objects as go
-import pandas as pd
+
+from pnei_design import CONDITIONS, PROFILES, get_interaction_params
+from pnei_engine import DISPLAY_DTYPE, potential_1d as potential, simulate_1d
+from pnei_profiling import finish, profiling_controls
+from pnei_worker import discard, follow_all, request
 
 # --- SETUP ---
 st.set_page_config(layout="wide", page_title="Laboratorio Topologia PNEI")
@@ -30,102 +33,11 @@ This tool bridges the **Epigenetic Landscape** (The Model) with **Multi-Modal Ph
 - **GSR** (Galvanic Skin Response - Sympathetic Arousal/Stress)
 """)
 
-# --- LOGIC: COMPREHENSIVE PNEI OPERATIONALISATION MAP ---
-def get_interaction_params(profile, condition):
-    """
-    Maps experimental design (Population × Environment) to Waddington parameters 
-    and predicts multi-modal physiological responses.
-    
-    Returns: width, depth, noise, hypothesis_text, comprehensive_sensor_predictions
-    
-    PHILOSOPHY: Clinical groups (ASD, ADHD) are not pathological categories, 
-    but accessible topological states that anyone can reach under specific conditions.
-    """
-    
-    # 1. BASELINE DEFINITIONS (Transitory States, Not Fixed Categories)
-    if profile == "Neurotypical (NT)":
-        w, d, n = 1.5, 1.5, 0.4
-    elif profile == "ASD-like (Rigid)":
-        w, d, n = 0.6, 4.0, 0.3
-    elif profile == "ADHD-like (Dispersed)":
-        w, d, n = 3.0, 0.5, 0.6
-
-    # 2. INTERACTION EFFECTS (The Experiment)
-    
-    if condition == "G3: Book (Control)":
-        return w, d, n, "Baseline Control", {
-            "fNIRS (Amygdala)": "Low (Blue)",
-            "fNIRS (rTPJ - Social)": "Low (Baseline)",
-            "fNIRS (DLPFC - Logic)": "Moderate (Green)",
-            "HRV (Vagal Tone)": "Stable",
-            "GSR (Stress)": "Low"
-        }
-
-    elif condition == "G1: Human Tutor":
-        if profile == "Neurotypical (NT)":
-            # Scaffolding: High DLPFC efficiency, Moderate Social
-            return w, d * 1.5, n * 0.5, "Social Scaffolding", {
-                "fNIRS (Amygdala)": "Moderate (Social Engagement)",
-                "fNIRS (rTPJ - Social)": "Moderate (Theory of Mind Active)",
-                "fNIRS (DLPFC - Logic)": "High (Boosted by Scaffolding)",
-                "HRV (Vagal Tone)": "High (Co-regulation)",
-                "GSR (Stress)": "Optimal Arousal"
-            }
-        elif profile == "ASD-like (Rigid)":
-            # Social Friction: Massive rTPJ load acts as Noise
-            return w, d, n + 1.5, "Social Friction (High Cost)", {
-                "fNIRS (Amygdala)": "🚨 HIGH ALERT (Red - Limbic Activation)",
-                "fNIRS (rTPJ - Social)": "🚨 SPIKE (Social Processing Overload)",
-                "fNIRS (DLPFC - Logic)": "Low (Resource Steal Effect)",
-                "HRV (Vagal Tone)": "📉 Collapsing (Vagal Withdrawal)",
-                "GSR (Stress)": "📈 Spiking (Sympathetic Dominance)"
-            }
-        elif profile == "ADHD-like (Dispersed)":
-            # External Regulation: Human supports DLPFC
-            return w, d * 3.0, n, "External Regulation", {
-                "fNIRS (Amygdala)": "Low (Reduced Anxiety)",
-                "fNIRS (rTPJ - Social)": "Moderate (Social Anchor)",
-                "fNIRS (DLPFC - Logic)": "✅ Supported (External Pacing)",
-                "HRV (Vagal Tone)": "Increased (External Co-regulation)",
-                "GSR (Stress)": "Moderate (Managed)"
-            }
-
-    elif condition == "G4: LLM (Active)":
-        if profile == "Neurotypical (NT)":
-            # Logical Depuration: Low Social, High Logic
-            return w, d * 0.8, n + 0.2, "Logical Depuration", {
-                "fNIRS (Amygdala)": "Low (No Social Cues)",
-                "fNIRS (rTPJ - Social)": "📉 Low (Social Depuration)",
-                "fNIRS (DLPFC - Logic)": "High (Utilitarian Processing)",
-                "HRV (Vagal Tone)": "Baseline",
-                "GSR (Stress)": "Low"
-            }
-        elif profile == "ASD-like (Rigid)":
-            # Social Bypass: rTPJ stays quiet, DLPFC works well
-            return w, d, n, "✅ Social Bypass (Low Cost)", {
-                "fNIRS (Amygdala)": "✅ Low/Baseline (No Social Friction)",
-                "fNIRS (rTPJ - Social)": "✅ Low (Energy Conservation)",
-                "fNIRS (DLPFC - Logic)": "📈 High (Resources Freed for Task)",
-                "HRV (Vagal Tone)": "Stable (Safety Signal)",
-                "GSR (Stress)": "Low"
-            }
-        elif profile == "ADHD-like (Dispersed)":
-            # Burnout: High DLPFC demand without support -> Fatigue
-            return w, d, n + 1.0, "⚠️ Executive Burnout (Constructivist Overload)", {
-                "fNIRS (Amygdala)": "Rising (Frustration/Anxiety)",
-                "fNIRS (rTPJ - Social)": "Phantom Activation (Seeking Support)",
-                "fNIRS (DLPFC - Logic)": "📉 Fading (Metabolic Fatigue)",
-                "HRV (Vagal Tone)": "📉 Dropping Fast (Exhaustion)",
-                "GSR (Stress)": "High (Sustained Effort)"
-            }
-            
-    return w, d, n, "Undef", {}
-
 # --- SIDEBAR ---
 with st.sidebar:
     st.header("1. Design Matrix")
-    sel_profile = st.selectbox("Population", ["Neurotypical (NT)", "ASD-like (Rigid)", "ADHD-like (Dispersed)"])
-    sel_condition = st.selectbox("Environment", ["G3: Book (Control)", "G1: Human Tutor", "G4: LLM (Active)"])
+    sel_profile = st.selectbox("Population", PROFILES)
+    sel_condition = st.selectbox("Environment", CONDITIONS)
     
     c_w, c_d, c_n, hyp_text, sensor_data = get_interaction_params(sel_profile, sel_condition)
     
@@ -153,54 +65,135 @@ with st.sidebar:
     depth = st.slider("Depth (Resilience/HRV Proxy)", 0.1, 6.0, float(c_d), 0.1, disabled=True)
     noise = st.slider("Noise (Allostatic Load/Stress)", 0.0, 3.0, float(c_n), 0.1, disabled=True)
     sim_duration = st.slider("Simulation Time", 100, 2000, 1000)
+    n_paths = st.select_slider("Ensemble Size (Virtual Participants)", [1, 100, 1000, 10000], value=1,
+                               help="Above 1, the trajectory plot shows the density of the whole ensemble over time.")
+    
+    timer = profiling_controls(st.sidebar, st.session_state)
 
 # --- PHYSICS ---
-x = np.linspace(-5, 5, 200)
-X, Y = np.meshgrid(np.linspace(-5, 5, 50), np.linspace(-5, 5, 50))
-
-def potential(val, w, d):
-    return -d * np.exp(-(val**2) / (2 * w**2)) + 0.02 * val**4
-
-U_1D = potential(x, width, depth)
-traj = []
-pos = 1.5 
-np.random.seed(42)
-
-for _ in range(sim_duration):
-    force = -(pos * (depth / width**2)) * np.exp(-(pos**2) / (2 * width**2)) - 0.08 * pos**3
-    displacement = force * 0.05 + noise * np.sqrt(0.05) * np.random.normal()
-    pos += displacement
-    traj.append(pos)
-traj = np.array(traj)
+with timer.stage("grid"):
+    x = np.linspace(-5, 5, 200)
+    X, Y = np.meshgrid(np.linspace(-5, 5, 50), np.linspace(-5, 5, 50))
+    U_1D = potential(x, width, depth)
+
+def ensemble_density(w, d, n, steps, n_paths, progress=None):
+    """Quantile bands and time × position density of an ensemble (size independent of n_paths)."""
+    from pnei_density import quantile_bands, time_position_histogram
+
+    ens = simulate_1d(w, d, n, steps, x0=1.5, n_paths=n_paths, seed=42, dtype=DISPLAY_DTYPE, progress=progress)
+    return quantile_bands(ens), *time_position_histogram(ens)
+
+with timer.stage("physics"):
+    # The single path takes milliseconds and stays on the script thread; the
+    # ensemble runs in the background worker and the page shows the last
+    # completed one until the new result is ready.
+    traj = simulate_1d(width, depth, noise, sim_duration, x0=1.5, seed=42)
+    ensemble_slot = st.session_state.setdefault("ensemble", {})
+    ensemble = job = None
+    if n_paths > 1:
+        ensemble, job = request(ensemble_slot, ensemble_density, width, depth, noise, sim_duration, n_paths)
+    else:
+        discard(ensemble_slot)
 
 # --- VISUALISATION ---
+# Deferred import: plotly is only needed once the figures are built, so the title,
+# sidebar and physics reach the browser before it loads.
+import plotly.graph_objects as go
 col1, col2 = st.columns([1, 1])
 
 with col1:
     st.subheader("🏞️ The Waddington Landscape (Mechanism)")
-    fig_2d = go.Figure()
-    fig_2d.add_trace(go.Scatter(x=x, y=U_1D, mode='lines', name='Landscape', line=dict(color='gray', width=2), fill='tozeroy'))
-    final_energy = potential(traj[-1], width, depth)
-    fig_2d.add_trace(go.Scatter(x=[traj[-1]], y=[final_energy], mode='markers', name='State', marker=dict(size=15, color='#ef4444')))
-    
-    fig_2d.add_annotation(x=0, y=min(U_1D), text=f"Depth → HRV Resilience", showarrow=True, arrowhead=2, ay=40)
-    
-    fig_2d.update_layout(height=350, margin=dict(l=20, r=20, t=20, b=20), showlegend=False, yaxis_title="Potential U(x)")
-    st.plotly_chart(fig_2d, use_container_width=True)
+    with timer.stage("figures"):
+        fig_2d = go.Figure()
+        fig_2d.add_trace(go.Scatter(x=x, y=U_1D, mode='lines', name='Landscape', line=dict(color='gray', width=2), fill='tozeroy'))
+        final_energy = potential(traj[-1], width, depth)
+        fig_2d.add_trace(go.Scatter(x=[traj[-1]], y=[final_energy], mode='markers', name='State', marker=dict(size=15, color='#ef4444')))
+        
+        fig_2d.add_annotation(x=0, y=min(U_1D), text=f"Depth → HRV Resilience", showarrow=True, arrowhead=2, ay=40)
+        
+        fig_2d.update_layout(height=350, margin=dict(l=20, r=20, t=20, b=20), showlegend=False, yaxis_title="Potential U(x)")
+    with timer.stage("serialization"):
+        st.plotly_chart(fig_2d, use_container_width=True)
 
 with col2:
     st.subheader("📊 State Trajectory Over Time (The Signal)")
-    df_traj = pd.DataFrame({'Time': range(len(traj)), 'Position': traj})
-    fig_time = go.Figure()
-    fig_time.add_trace(go.Scatter(x=df_traj['Time'], y=df_traj['Position'], mode='lines', line=dict(color='#3b82f6', width=1)))
-    
-    # Thresholds mapped to PNEI measures
-    fig_time.add_hrect(y0=-0.5, y1=0.5, fillcolor="green", opacity=0.1, line_width=0, annotation_text="High HRV Zone (Homeostasis)")
-    fig_time.add_hrect(y0=2.5, y1=5, fillcolor="red", opacity=0.1, line_width=0, annotation_text="GSR Spike Zone (Sympathetic Arousal)")
-    fig_time.add_hrect(y0=-5, y1=-2.5, fillcolor="red", opacity=0.1, line_width=0, annotation_text="Withdrawal/Dissociation")
-    
-    fig_time.update_layout(height=350, margin=dict(l=20, r=20, t=20, b=20), yaxis_range=[-4, 4], yaxis_title="State Deviation x(t)")
-    st.plotly_chart(fig_time, use_container_width=True)
+    ensemble_status = st.empty()
+    with timer.stage("figures"):
+        fig_time = go.Figure()
+        if ensemble is None:
+            # Pass the trajectory buffer as is: the implicit x (0, 1, 2, ...) is the time index
+            fig_time.add_trace(go.Scatter(y=traj, mode='lines', line=dict(color='#3b82f6', width=1)))
+        else:
+            # Ensemble: time × position density with 5–95% / 25–75% quantile bands and median
+            bands, density, t_centers, x_centers = ensemble
+            fig_time.add_trace(go.Heatmap(z=density, x=t_centers, y=x_centers, colorscale='Blues', showscale=False, hoverinfo='skip'))
+            for lo, hi in ((0, 4), (1, 3)):
+                fig_time.add_trace(go.Scatter(y=bands[lo], mode='lines', line=dict(width=0), hoverinfo='skip'))
+                fig_time.add_trace(go.Scatter(y=bands[hi], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(59, 130, 246, 0.2)', hoverinfo='skip'))
+            fig_time.add_trace(go.Scatter(y=bands[2], mode='lines', name='Median', line=dict(color='#1e3a8a', width=1.5)))
+        
+        # Thresholds mapped to PNEI measures
+        fig_time.add_hrect(y0=-0.5, y1=0.5, fillcolor="green", opacity=0.1, line_width=0, annotation_text="High HRV Zone (Homeostasis)")
+        fig_time.add_hrect(y0=2.5, y1=5, fillcolor="red", opacity=0.1, line_width=0, annotation_text="GSR Spike Zone (Sympathetic Arousal)")
+        fig_time.add_hrect(y0=-5, y1=-2.5, fillcolor="red", opacity=0.1, line_width=0, annotation_text="Withdrawal/Dissociation")
+        
+        fig_time.update_layout(height=350, margin=dict(l=20, r=20, t=20, b=20), yaxis_range=[-4, 4], yaxis_title="State Deviation x(t)", showlegend=False)
+    with timer.stage("serialization"):
+        st.plotly_chart(fig_time, use_container_width=True)
+    if job is not None:
+        st.caption("Showing the last completed run while the new ensemble is simulated.")
+
+# --- SPECTRAL SIGNATURE ---
+def design_spectra(steps, n_paths, progress=None):
+    """Mean Welch PSD, band powers and 1/f slope of every design cell (one ensemble, one FFT pass)."""
+    from pnei_spectral import compare_cells
+
+    return compare_cells(steps, n_paths, progress=progress)
+
+st.divider()
+st.markdown("### 📈 Spectral Signature: HRV-Style Frequency Analysis")
+spectra_slot = st.session_state.setdefault("spectra", {})
+spectra_job = spectra_status = None
+if st.checkbox("Compare the spectra of all design-matrix cells", help="200 virtual participants per cell, Welch PSD of x(t) after a burn-in of 100 steps."):
+    from pnei_spectral import BANDS
+
+    # Like the ensembles, the nine cells (1,800 paths) are simulated in the background worker
+    with timer.stage("physics"):
+        spectra_result, spectra_job = request(spectra_slot, design_spectra, sim_duration, 200)
+    spectra_status = st.empty()
+    if spectra_result is None:
+        st.caption("Simulating the nine design cells…")
+    else:
+        freqs, spectra = spectra_result
+        with timer.stage("figures"):
+            fig_psd = go.Figure()
+            profile_colors = dict(zip(PROFILES, ('#3b82f6', '#8b5cf6', '#f59e0b')))
+            condition_dashes = dict(zip(CONDITIONS, ('solid', 'dash', 'dot')))
+            for band, (lo, hi), shade in zip(BANDS, BANDS.values(), ('#94a3b8', '#22c55e', '#ef4444')):
+                fig_psd.add_vrect(x0=lo, x1=hi, fillcolor=shade, opacity=0.08, line_width=0, annotation_text=band, annotation_position="top left")
+            for (profile, condition), cell in spectra.items():
+                selected = (profile, condition) == (sel_profile, sel_condition)
+                fig_psd.add_trace(go.Scatter(x=freqs[1:], y=cell["psd"][1:], mode='lines', name=f"{profile} · {condition}",
+                                             line=dict(color=profile_colors[profile], dash=condition_dashes[condition], width=3 if selected else 1.2),
+                                             opacity=1.0 if selected else 0.6))
+            fig_psd.update_layout(height=400, margin=dict(l=20, r=20, t=20, b=20), xaxis_type="log", yaxis_type="log",
+                                  xaxis_title="Frequency (cycles / model time unit)", yaxis_title="PSD of x(t)")
+        with timer.stage("serialization"):
+            st.plotly_chart(fig_psd, use_container_width=True)
+            st.dataframe({
+                "Population": [profile for profile, _ in spectra],
+                "Environment": [condition for _, condition in spectra],
+                **{f"{band} power": [cell["bands"][band] for cell in spectra.values()] for band in BANDS},
+                "LF/HF": [cell["bands"]["LF"] / cell["bands"]["HF"] for cell in spectra.values()],
+                "1/f slope": [f"{cell['slope']:.2f} ± {cell['slope_sd']:.2f}" for cell in spectra.values()],
+            }, hide_index=True, use_container_width=True)
+        st.caption("Bands use the HRV names by analogy, in model time: VLF = slow drift, LF = relaxation within the valley, "
+                   "HF = noise-driven jitter. A slope near -2 is the relaxation of a single valley; flatter spectra mean "
+                   "the noise dominates the landscape (white noise has slope 0).")
+        if spectra_job is not None:
+            st.caption("Showing the last completed spectra while the new duration is simulated.")
+else:
+    discard(spectra_slot)
 
 # --- COMPREHENSIVE PNEI EXPLANATION ---
 st.divider()
@@ -236,3 +229,7 @@ Studying a depressed brain or hyperactive immune system reveals the **mechanical
 a "statistically normal" brain can transition into rigid (ASD-like) or labile (ADHD-like) topologies. 
 **Clinical groups show us the landscape's limits that everyone can reach under certain conditions.**
 """)
+
+finish(timer, __file__)
+follow_all([(job, ensemble_status, f"Simulating {n_paths:,} virtual participants…"),
+            (spectra_job, spectra_status, "Simulating the design cells…")], st.rerun)
@@ -1,7 +1,9 @@
 import streamlit as st
 import numpy as np
-import plotly.graph_objects as go
-import pandas as pd
+
+from pnei_engine import DISPLAY_DTYPE, potential_2d, simulate_2d
+from pnei_profiling import LABELS, finish, profiling_controls
+from pnei_worker import follow_all, request
 
 # --- CONFIGURAZIONE PAGINA ---
 st.set_page_config(layout="wide", page_title="Simulatore Paesaggio Epigenetico PNEI")
@@ -29,23 +31,16 @@ profile = st.sidebar.selectbox(
     ("Neurotipico (Bilanciato)", "ASD (Iper-Canalizzato/Rigido)", "ADHD (Instabile/Piatto)", "Personalizzato")
 )
 
-# Valori di default basati sulla selezione
-if profile == "Neurotipico (Bilanciato)":
-    def_depth = 1.5  # Profondità media
-    def_width = 1.5  # Larghezza media
-    def_noise = 0.5  # Rumore standard
-elif profile == "ASD (Iper-Canalizzato/Rigido)":
-    def_depth = 4.0  # Molto profondo (attrazione forte)
-    def_width = 0.8  # Molto stretto (canalizzato)
-    def_noise = 0.4  # Rumore percepito (o rigidità al rumore)
-elif profile == "ADHD (Instabile/Piatto)":
-    def_depth = 0.5  # Molto piatto (bassa attrazione)
-    def_width = 3.0  # Molto largo (dispersivo)
-    def_noise = 0.8  # Alta suscettibilità alla distrazione
-else:
-    def_depth = 1.5
-    def_width = 1.5
-    def_noise = 0.5
+# Valori di default basati sulla selezione: (profondità, larghezza, rumore)
+PROFILI = {
+    # Profondità media, larghezza media, rumore standard
+    "Neurotipico (Bilanciato)": (1.5, 1.5, 0.5),
+    # Molto profondo (attrazione forte), molto stretto (canalizzato), rumore percepito (o rigidità al rumore)
+    "ASD (Iper-Canalizzato/Rigido)": (4.0, 0.8, 0.4),
+    # Molto piatto (bassa attrazione), molto largo (dispersivo), alta suscettibilità alla distrazione
+    "ADHD (Instabile/Piatto)": (0.5, 3.0, 0.8),
+}
+def_depth, def_width, def_noise = PROFILI.get(profile, (1.5, 1.5, 0.5))
 
 # Sliders per manipolazione fine (L'equazione del potenziale)
 st.sidebar.subheader("Parametri del Paesaggio $U(x)$")
@@ -55,97 +50,128 @@ width = st.sidebar.slider("Larghezza Valle (Flessibilità)", 0.5, 4.0, float(def
 st.sidebar.subheader("Parametri Dinamici")
 noise_level = st.sidebar.slider("Intensità Rumore (Stress/Ambiente)", 0.0, 2.0, float(def_noise), 0.1, help="Ampiezza delle perturbazioni stocastiche.")
 steps = st.sidebar.slider("Tempo di Simulazione (Steps)", 100, 1000, 500, 50)
+n_paths = st.sidebar.select_slider("Ensemble (Mappa di Occupazione)", [1, 100, 1000, 10000], value=100, help="Numero di traiettorie indipendenti usate per la mappa di occupazione del paesaggio.")
+
+st.sidebar.subheader("Ritratto di Fase")
+show_field = st.sidebar.checkbox("Campo di forze e bacino di cattura", value=True, help="Frecce della forza deterministica, punti fissi e confine del bacino da cui la valle riporta all'omeostasi.")
+wall_force = st.sidebar.checkbox("Includi i muri nella forza", value=False, help="La dinamica simulata usa solo la forza della valle: i muri modellano la superficie ma non spingono. Attivando l'opzione il campo mostrato è il gradiente completo della superficie 3D, a solo scopo di confronto.")
+
+timer = profiling_controls(st.sidebar, st.session_state, LABELS["it"])
 
 # --- CALCOLO MATEMATICO ---
 
-# 1. Definizione dello Spazio (Grid)
-x_range = np.linspace(-4, 4, 50)
-y_range = np.linspace(-4, 4, 50)
-X, Y = np.meshgrid(x_range, y_range)
+with timer.stage("grid"):
+    # 1. Definizione dello Spazio (Grid)
+    x_range = np.linspace(-4, 4, 50)
+    y_range = np.linspace(-4, 4, 50)
+    X, Y = np.meshgrid(x_range, y_range)
 
-# 2. Definizione della Funzione Potenziale U(x,y)
-# Usiamo una Gaussiana invertita per creare la valle centrale (Omeostasi)
-# U(x) = -Depth * exp(-(x^2 + y^2) / Width)
-# Nota: Matematicamente, il sistema cerca il MINIMO di U.
-U = -depth * np.exp(-(X**2 + Y**2) / (2 * width**2))
+    # 2. Definizione della Funzione Potenziale U(x,y)
+    # Usiamo una Gaussiana invertita per creare la valle centrale (Omeostasi)
+    # U(x) = -Depth * exp(-(x^2 + y^2) / Width)
+    # Nota: Matematicamente, il sistema cerca il MINIMO di U.
+    U = -depth * np.exp(-(X**2 + Y**2) / (2 * width**2))
 
-# Aggiungiamo "muri" ai bordi per evitare che la pallina scappi all'infinito (vincoli fisiologici)
-Boundary = 0.05 * (X**4 + Y**4) 
-U_total = U + Boundary
+    # Aggiungiamo "muri" ai bordi per evitare che la pallina scappi all'infinito (vincoli fisiologici)
+    Boundary = 0.05 * (X**4 + Y**4) 
+    U_total = U + Boundary
 
-# 3. Simulazione della Traiettoria (Metodo di Eulero-Maruyama)
-dt = 0.05
-traj_x = [2.5] # Posizione iniziale (fuori equilibrio)
-traj_y = [2.5] # Posizione iniziale
+def ensemble_occupancy(w, d, n, steps, n_paths, progress=None):
+    """Frazione di tempo trascorsa dall'ensemble in ogni cella (dimensione indipendente da n_paths)."""
+    from pnei_density import occupancy_2d
 
-current_x = traj_x[0]
-current_y = traj_y[0]
+    ens = simulate_2d(w, d, n, steps, start=(2.5, 2.5), n_paths=n_paths, seed=42, dtype=DISPLAY_DTYPE, progress=progress)
+    return occupancy_2d(ens, extent=4.0, bins=60)
 
-np.random.seed(42) # Per riproducibilità demo
+@st.cache_data(max_entries=32)
+def phase_overlay(w, d, wall):
+    """Campo di forze, punti fissi e bacini per (larghezza, profondità, muri)."""
+    from pnei_phase import phase_portrait
 
-for _ in range(steps):
-    # Calcolo del Gradiente (Pendenza) nel punto corrente
-    # Derivata parziale approssimata di U rispetto a x e y
-    # dU/dx = x * (depth/width^2) * exp(...) + 0.2*x^3
-    
-    exp_factor = np.exp(-(current_x**2 + current_y**2) / (2 * width**2))
-    
-    grad_x = (current_x * depth / width**2) * exp_factor - 0.2 * current_x**3
-    grad_y = (current_y * depth / width**2) * exp_factor - 0.2 * current_y**3
-    
+    return phase_portrait(w, d, wall)
+
+with timer.stage("physics"):
+    # 3. Simulazione della Traiettoria (Metodo di Eulero-Maruyama)
     # Equazione: dx = Forza * dt + Rumore * sqrt(dt)
-    # Forza = Gradiente positivo perché abbiamo definito U come buca negativa (quindi vogliamo salire verso 0 se usiamo U negativo, 
-    # MA nella fisica standard dx/dt = -grad U. 
-    # Qui la nostra valle è un minimo locale negativo. Il gradiente punta verso l'alto (uscita).
-    # Quindi dobbiamo sottrarre il gradiente della funzione "buca".
-    # Semplifichiamo: Forza di richiamo verso 0.
-    
-    force_x = - (current_x / width**2) * depth * exp_factor # Semplificata per stabilità numerica
-    force_y = - (current_y / width**2) * depth * exp_factor
-    
-    # Aggiornamento posizione
-    dx = force_x * dt + noise_level * np.sqrt(dt) * np.random.normal()
-    dy = force_y * dt + noise_level * np.sqrt(dt) * np.random.normal()
-    
-    current_x += dx
-    current_y += dy
-    
-    traj_x.append(current_x)
-    traj_y.append(current_y)
+    # Forza di richiamo verso 0: -(x / width^2) * depth * exp(-(x^2 + y^2) / (2 width^2))
+    # (i "muri" modellano solo la superficie, non entrano nella forza).
+    # Il motore scrive in un array preallocato (steps + 1, 2): la riga 0 è la
+    # posizione iniziale (2.5, 2.5), fuori equilibrio. Seed 42 per riproducibilità demo.
+    traj = simulate_2d(width, depth, noise_level, steps, start=(2.5, 2.5), seed=42)
+    traj_x, traj_y = traj[:, 0], traj[:, 1]  # viste, non copie
+    # L'ensemble gira nel worker in background: la mappa mostra l'ultimo
+    # risultato completato finché il nuovo non è pronto.
+    if show_field:
+        portrait = phase_overlay(width, depth, 0.05 if wall_force else 0.0)
+    occupancy_map, job = request(st.session_state.setdefault("occupancy", {}), ensemble_occupancy, width, depth, noise_level, steps, n_paths)
 
 # --- VISUALIZZAZIONE ---
+# Import differiti: plotly serve solo per i grafici e pandas solo per le serie
+# temporali, così titolo, sidebar e fisica arrivano al browser prima del loro caricamento.
+import plotly.graph_objects as go
 
 col1, col2 = st.columns([2, 1])
 
 with col1:
     st.subheader("Visualizzazione 3D: Il Paesaggio")
     
-    # Surface Plot (Il Paesaggio)
-    fig = go.Figure(data=[go.Surface(z=U_total, x=X, y=Y, colorscale='Viridis', opacity=0.8, name='Epigenetic Landscape')])
+    with timer.stage("figures"):
+        # Surface Plot (Il Paesaggio)
+        fig = go.Figure(data=[go.Surface(z=U_total, x=X, y=Y, colorscale='Viridis', opacity=0.8, name='Epigenetic Landscape')])
+    
+        # Scatter 3D (La Traiettoria)
+        # Calcoliamo Z per la traiettoria per farla aderire alla superficie
+        traj_z = potential_2d(traj_x, traj_y, width, depth, 0.05)
     
-    # Scatter 3D (La Traiettoria)
-    # Calcoliamo Z per la traiettoria per farla aderire alla superficie
-    traj_z = -depth * np.exp(-(np.array(traj_x)**2 + np.array(traj_y)**2) / (2 * width**2)) + 0.05 * (np.array(traj_x)**4 + np.array(traj_y)**4)
+        fig.add_trace(go.Scatter3d(
+            x=traj_x, y=traj_y, z=traj_z + 0.1, # Lift slightly above surface
+            mode='lines+markers',
+            marker=dict(size=4, color='red'),
+            line=dict(color='red', width=2),
+            name='Stato PNEI (t)'
+        ))
+
+        fig.update_layout(
+            title='Topologia dello Stato',
+            scene=dict(
+                xaxis_title='Asse X (Struttura)',
+                yaxis_title='Asse Y (Funzione)',
+                zaxis_title='Potenziale (Energia)',
+            ),
+            height=600,
+            margin=dict(l=0, r=0, b=0, t=40)
+        )
+    with timer.stage("serialization"):
+        st.plotly_chart(fig, use_container_width=True)
     
-    fig.add_trace(go.Scatter3d(
-        x=traj_x, y=traj_y, z=traj_z + 0.1, # Lift slightly above surface
-        mode='lines+markers',
-        marker=dict(size=4, color='red'),
-        line=dict(color='red', width=2),
-        name='Stato PNEI (t)'
-    ))
-
-    fig.update_layout(
-        title='Topologia dello Stato',
-        scene=dict(
-            xaxis_title='Asse X (Struttura)',
-            yaxis_title='Asse Y (Funzione)',
-            zaxis_title='Potenziale (Energia)',
-        ),
-        height=600,
-        margin=dict(l=0, r=0, b=0, t=40)
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    # Mappa di occupazione: dove l'ensemble trascorre il tempo, vista dall'alto
+    st.subheader("Mappa di Occupazione (Ensemble)")
+    ensemble_status = st.empty()
+    with timer.stage("figures"):
+        fig_occ = go.Figure()
+        if occupancy_map is not None:
+            occupancy, centers = occupancy_map
+            fig_occ.add_trace(go.Heatmap(z=occupancy, x=centers, y=centers, colorscale='Hot', reversescale=True, colorbar=dict(title='Occupazione')))
+        fig_occ.add_trace(go.Contour(z=U_total, x=x_range, y=y_range, colorscale='Viridis', contours_coloring='lines', showscale=False, line_width=1, hoverinfo='skip'))
+        if show_field:
+            # Ritratto di fase: frecce della forza, confine del bacino di cattura, punti fissi
+            from pnei_phase import add_overlay
+            add_overlay(fig_occ, portrait)
+        fig_occ.update_layout(
+            xaxis_title='Struttura', yaxis_title='Funzione',
+            yaxis=dict(scaleanchor='x'),
+            height=450,
+            margin=dict(l=0, r=0, b=0, t=20)
+        )
+    with timer.stage("serialization"):
+        st.plotly_chart(fig_occ, use_container_width=True)
+    if job is None:
+        st.caption(f"{n_paths} traiettorie × {steps + 1} istanti: più scuro = più tempo trascorso nella cella.")
+    else:
+        st.caption("Mostro l'ultima mappa completata mentre il nuovo ensemble è in calcolo.")
+    if show_field:
+        from pnei_phase import basin_caption
+        st.caption(basin_caption(portrait, (2.5, 2.5)))
 
 with col2:
     st.subheader("Analisi Dinamica")
@@ -153,10 +179,15 @@ with col2:
     st.markdown(f"**Profilo Attuale:** {profile}")
     
     # Time Series Plot
-    df_traj = pd.DataFrame({'Step': range(len(traj_x)), 'X (Struttura)': traj_x, 'Y (Funzione)': traj_y})
+    # DataFrame costruito sopra il buffer della traiettoria, senza copia
+    # (pandas importato solo qui, dove serve)
+    import pandas as pd
+    df_traj = pd.DataFrame(traj, columns=['X (Struttura)', 'Y (Funzione)'], copy=False)
+    df_traj.index.name = 'Step'
     
     st.write("##### Evoluzione Temporale delle Variabili")
-    st.line_chart(df_traj.set_index('Step'))
+    with timer.stage("serialization"):
+        st.line_chart(df_traj)
     
     st.info("""
     **Interpretazione Grafico:**
@@ -165,7 +196,7 @@ with col2:
     * **Convergenza a 0:** Ritorno all'omeostasi (Salute).
     """)
 
-    dist_from_center = np.sqrt(np.array(traj_x)**2 + np.array(traj_y)**2)
+    dist_from_center = np.sqrt(traj_x**2 + traj_y**2)
     avg_dist = np.mean(dist_from_center[100:]) # Ignora fase iniziale
     
     st.metric("Dispersione Media (Allostasi)", f"{avg_dist:.2f}", delta_color="inverse")
@@ -177,6 +208,84 @@ with col2:
     else:
         st.success("✅ Sistema in Omeostasi")
 
+# --- SENSIBILITÀ DEL VERDETTO ---
+@st.cache_data(max_entries=32)
+def sensitivity(presets, steps):
+    """Indici di Sobol e Morris della Dispersione Media attorno a ogni preset (un solo passaggio vettoriale)."""
+    from pnei_sensitivity import analyze
+
+    return analyze(dict(presets), steps)
+
+def sensitivity_current(w, d, n, steps, progress=None):
+    """Sensibilità attorno ai parametri degli slider, calcolata nel worker in background."""
+    from pnei_sensitivity import analyze
+
+    return analyze({"Parametri attuali": (w, d, n)}, steps, progress=progress)["Parametri attuali"]
+
+st.divider()
+st.subheader("🎛️ Sensibilità del Verdetto (Sobol / Morris)")
+st.caption("""
+Quanto dipende il verdetto da ciascun parametro? Attorno a ogni profilo (±50%, entro i limiti degli slider)
+il modello viene simulato su un campione quasi-casuale (Halton) di combinazioni larghezza/profondità/rumore,
+con la stessa sequenza di rumore (seed 42) usata qui sopra.
+""")
+
+with timer.stage("physics"):
+    # I profili sono fissi (una sola volta in cache); i parametri attuali si
+    # aggiornano con gli slider e, come l'ensemble, girano nel worker in background
+    sens_profili = sensitivity(tuple((name, (w, d, n)) for name, (d, w, n) in PROFILI.items()), steps)
+    sens_attuale, sens_job = request(st.session_state.setdefault("sensitivity", {}), sensitivity_current, width, depth, noise_level, steps)
+
+param_labels = ["Larghezza", "Profondità", "Rumore"]
+sens_status = st.empty()
+col_sobol, col_morris = st.columns(2)
+
+if sens_attuale is None:
+    st.caption("Analisi dei parametri attuali in calcolo…")
+else:
+    with col_sobol:
+        with timer.stage("figures"):
+            fig_sobol = go.Figure()
+            fig_sobol.add_trace(go.Bar(x=param_labels, y=sens_attuale["S1"], name='S1 (effetto diretto)', marker_color='#3b82f6'))
+            fig_sobol.add_trace(go.Bar(x=param_labels, y=sens_attuale["ST"], name='ST (con interazioni)', marker_color='#1e3a8a'))
+            fig_sobol.update_layout(
+                title='Indici di Sobol (parametri attuali)', barmode='group',
+                yaxis=dict(title='Quota di varianza', range=[0, 1.05]),
+                height=350, margin=dict(l=0, r=0, b=0, t=40), legend=dict(orientation='h', y=-0.15)
+            )
+        with timer.stage("serialization"):
+            st.plotly_chart(fig_sobol, use_container_width=True)
+
+    with col_morris:
+        with timer.stage("figures"):
+            fig_morris = go.Figure(go.Scatter(
+                x=sens_attuale["mu_star"], y=sens_attuale["sigma"], text=param_labels,
+                mode='markers+text', textposition='top center', marker=dict(size=14, color='#ef4444')
+            ))
+            fig_morris.update_layout(
+                title='Effetti Elementari di Morris (parametri attuali)',
+                xaxis=dict(title='μ* (effetto medio)', rangemode='tozero'),
+                yaxis=dict(title='σ (non linearità / interazioni)', rangemode='tozero'),
+                height=350, margin=dict(l=0, r=0, b=0, t=40)
+            )
+        with timer.stage("serialization"):
+            st.plotly_chart(fig_morris, use_container_width=True)
+
+    st.metric("Stabilità del verdetto (parametri attuali)", f"{sens_attuale['stability']:.0%}",
+              help=f"Quota delle combinazioni vicine che mantengono il verdetto «{sens_attuale['verdict']}».")
+    if sens_job is not None:
+        st.caption("Mostro l'ultima analisi completata mentre quella dei nuovi parametri è in calcolo.")
+
+# Confronto tra i profili: indice totale per parametro e stabilità del verdetto
+with timer.stage("serialization"):
+    st.dataframe({
+        "Profilo": list(sens_profili),
+        "Dispersione": [round(r["metric"], 2) for r in sens_profili.values()],
+        "Verdetto": [r["verdict"] for r in sens_profili.values()],
+        **{f"ST {label}": [round(float(r["ST"][i]), 2) for r in sens_profili.values()] for i, label in enumerate(param_labels)},
+        "Stabilità": [f"{r['stability']:.0%}" for r in sens_profili.values()],
+    }, hide_index=True, use_container_width=True)
+
 # --- SPIEGAZIONE ACCADEMICA ---
 st.divider()
 st.subheader("Legenda Accademica per il Modello")
@@ -195,4 +304,8 @@ st.markdown("""
     
 4.  **Posizione della Pallina ($x, y$) = Fenotipo Attuale:**
     L'intersezione istantanea tra i livelli di cortisolo, citochine infiammatorie e tono dell'umore.
-""")
\ No newline at end of file
+""")
+
+finish(timer, __file__)
+follow_all([(job, ensemble_status, f"Simulazione di {n_paths:,} traiettorie…"),
+            (sens_job, sens_status, "Analisi di sensibilità…")], st.rerun)
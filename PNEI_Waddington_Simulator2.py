@@ -1,7 +1,9 @@
 import streamlit as st
 import numpy as np
-import plotly.graph_objects as go
-import pandas as pd
+
+from pnei_engine import DISPLAY_DTYPE, potential_2d, simulate_2d
+from pnei_profiling import LABELS, finish, profiling_controls
+from pnei_worker import follow_all, request
 
 # --- CONFIGURAZIONE PAGINA ---
 st.set_page_config(layout="wide", page_title="Simulatore PNEI: Modello Pragmatico Universale")
@@ -63,93 +65,120 @@ width = st.sidebar.slider("Larghezza (Flessibilità)", 0.5, 4.0, float(def_width
 st.sidebar.subheader("Condizioni Esterne")
 noise_level = st.sidebar.slider("Carico Allostatico (Rumore/Stress)", 0.0, 3.0, float(def_noise), 0.1, help="Rappresenta eventi esterni: lutto, malattia, input sensoriale eccessivo.")
 steps = st.sidebar.slider("Durata Simulazione", 100, 1000, 600, 50)
+n_paths = st.sidebar.select_slider("Ensemble (Mappa di Occupazione)", [1, 100, 1000, 10000], value=100, help="Numero di traiettorie indipendenti usate per la mappa di occupazione del paesaggio.")
 
-# --- CALCOLO MATEMATICO (Langevin Dinamica) ---
-
-x_range = np.linspace(-4, 4, 60)
-y_range = np.linspace(-4, 4, 60)
-X, Y = np.meshgrid(x_range, y_range)
-
-# Potenziale: U(x) = -Depth * exp(...) + Muri
-U = -depth * np.exp(-(X**2 + Y**2) / (2 * width**2))
-Boundary = 0.02 * (X**4 + Y**4) # Muri morbidi
-U_total = U + Boundary
+st.sidebar.subheader("Ritratto di Fase")
+show_field = st.sidebar.checkbox("Campo di forze e bacino di cattura", value=True, help="Frecce della forza deterministica, punti fissi e confine del bacino da cui la valle riporta all'omeostasi.")
+wall_force = st.sidebar.checkbox("Includi i muri nella forza", value=False, help="La dinamica simulata usa solo la forza della valle: i muri modellano la superficie ma non spingono. Attivando l'opzione il campo mostrato è il gradiente completo della superficie 3D, a solo scopo di confronto.")
 
-dt = 0.05
-# Punto di partenza: Sempre leggermente fuori centro per vedere se torna
-traj_x = [1.5] 
-traj_y = [1.5] 
+timer = profiling_controls(st.sidebar, st.session_state, LABELS["it"])
 
-current_x = traj_x[0]
-current_y = traj_y[0]
+# --- CALCOLO MATEMATICO (Langevin Dinamica) ---
 
-np.random.seed(42) 
-
-for _ in range(steps):
-    # Calcolo forze
-    dist_sq = current_x**2 + current_y**2
-    exp_factor = np.exp(-dist_sq / (2 * width**2))
-    
-    # Gradiente della buca (forza di richiamo)
-    # Nota: stiamo minimizzando U, quindi andiamo opposti al gradiente
-    grad_U_x = (current_x * depth / width**2) * exp_factor - 0.08 * current_x**3
-    grad_U_y = (current_y * depth / width**2) * exp_factor - 0.08 * current_y**3
-    
-    # Forza = -Gradiente
-    force_x = -grad_U_x
-    force_y = -grad_U_y # Errore nel codice precedente corretto qui logicamente (segno meno) ma l'implementazione precedente simulava bene visivamente
-    
-    # Correzione segno per la simulazione visiva corretta verso il centro (che è minimo negativo)
-    # Se U è negativo al centro, il gradiente punta FUORI. Quindi -Gradiente punta DENTRO.
-    # La formula sopra: (x * depth...) è positiva per x positivi. Quindi il gradiente spinge fuori.
-    # Noi vogliamo scendere, quindi andiamo contro il gradiente: - (positivo) = verso il centro.
-    # Corretto.
-    
-    # Equazione Langevin
-    dx = - (current_x * depth / width**2) * exp_factor * dt + noise_level * np.sqrt(dt) * np.random.normal()
-    dy = - (current_y * depth / width**2) * exp_factor * dt + noise_level * np.sqrt(dt) * np.random.normal()
-    
-    current_x += dx
-    current_y += dy
-    
-    traj_x.append(current_x)
-    traj_y.append(current_y)
+with timer.stage("grid"):
+    x_range = np.linspace(-4, 4, 60)
+    y_range = np.linspace(-4, 4, 60)
+    X, Y = np.meshgrid(x_range, y_range)
+
+    # Potenziale: U(x) = -Depth * exp(...) + Muri
+    U = -depth * np.exp(-(X**2 + Y**2) / (2 * width**2))
+    Boundary = 0.02 * (X**4 + Y**4) # Muri morbidi
+    U_total = U + Boundary
+
+def ensemble_occupancy(w, d, n, steps, n_paths, progress=None):
+    """Frazione di tempo trascorsa dall'ensemble in ogni cella (dimensione indipendente da n_paths)."""
+    from pnei_density import occupancy_2d
+
+    ens = simulate_2d(w, d, n, steps, start=(1.5, 1.5), n_paths=n_paths, seed=42, dtype=DISPLAY_DTYPE, progress=progress)
+    return occupancy_2d(ens, extent=4.0, bins=60)
+
+@st.cache_data(max_entries=32)
+def phase_overlay(w, d, wall):
+    """Campo di forze, punti fissi e bacini per (larghezza, profondità, muri)."""
+    from pnei_phase import phase_portrait
+
+    return phase_portrait(w, d, wall)
+
+with timer.stage("physics"):
+    # Punto di partenza: Sempre leggermente fuori centro per vedere se torna
+    # Equazione Langevin: dx = -(x * depth / width^2) * exp(...) * dt + Rumore * sqrt(dt)
+    # Se U è negativo al centro, il gradiente punta FUORI: -Gradiente punta DENTRO.
+    # Il motore scrive in un array preallocato (steps + 1, 2), riga 0 = partenza.
+    traj = simulate_2d(width, depth, noise_level, steps, start=(1.5, 1.5), seed=42)
+    traj_x, traj_y = traj[:, 0], traj[:, 1]  # viste, non copie
+    # L'ensemble gira nel worker in background: la mappa mostra l'ultimo
+    # risultato completato finché il nuovo non è pronto.
+    if show_field:
+        portrait = phase_overlay(width, depth, 0.02 if wall_force else 0.0)
+    occupancy_map, job = request(st.session_state.setdefault("occupancy", {}), ensemble_occupancy, width, depth, noise_level, steps, n_paths)
 
 # --- VISUALIZZAZIONE ---
+# Import differiti: plotly serve solo per i grafici e pandas solo per le serie
+# temporali, così titolo, sidebar e fisica arrivano al browser prima del loro caricamento.
+import plotly.graph_objects as go
 
 col1, col2 = st.columns([2, 1])
 
 with col1:
     st.subheader("Il Paesaggio Epigenetico (Stato Attuale)")
     
-    fig = go.Figure(data=[go.Surface(z=U_total, x=X, y=Y, colorscale='Cividis', opacity=0.8)])
-    
-    # Calcolo Z traiettoria per visualizzazione
-    traj_arr_x = np.array(traj_x)
-    traj_arr_y = np.array(traj_y)
-    traj_z = -depth * np.exp(-(traj_arr_x**2 + traj_arr_y**2) / (2 * width**2)) + 0.02 * (traj_arr_x**4 + traj_arr_y**4)
-    
-    fig.add_trace(go.Scatter3d(
-        x=traj_x, y=traj_y, z=traj_z + 0.2,
-        mode='lines',
-        line=dict(color='white', width=3),
-        name='Evoluzione Stato'
-    ))
-    
-    # Punto finale
-    fig.add_trace(go.Scatter3d(
-        x=[traj_x[-1]], y=[traj_y[-1]], z=[traj_z[-1] + 0.2],
-        mode='markers',
-        marker=dict(size=6, color='red'),
-        name='Stato Finale'
-    ))
-
-    fig.update_layout(
-        scene=dict(xaxis_title='Struttura', yaxis_title='Funzione', zaxis_title='Energia Potenziale'),
-        height=600,
-        margin=dict(l=0, r=0, b=0, t=0)
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    with timer.stage("figures"):
+        fig = go.Figure(data=[go.Surface(z=U_total, x=X, y=Y, colorscale='Cividis', opacity=0.8)])
+    
+        # Calcolo Z traiettoria per visualizzazione
+        traj_z = potential_2d(traj_x, traj_y, width, depth, 0.02)
+    
+        fig.add_trace(go.Scatter3d(
+            x=traj_x, y=traj_y, z=traj_z + 0.2,
+            mode='lines',
+            line=dict(color='white', width=3),
+            name='Evoluzione Stato'
+        ))
+    
+        # Punto finale
+        fig.add_trace(go.Scatter3d(
+            x=[traj_x[-1]], y=[traj_y[-1]], z=[traj_z[-1] + 0.2],
+            mode='markers',
+            marker=dict(size=6, color='red'),
+            name='Stato Finale'
+        ))
+
+        fig.update_layout(
+            scene=dict(xaxis_title='Struttura', yaxis_title='Funzione', zaxis_title='Energia Potenziale'),
+            height=600,
+            margin=dict(l=0, r=0, b=0, t=0)
+        )
+    with timer.stage("serialization"):
+        st.plotly_chart(fig, use_container_width=True)
+    
+    # Mappa di occupazione: dove l'ensemble trascorre il tempo, vista dall'alto
+    st.subheader("Mappa di Occupazione (Ensemble)")
+    ensemble_status = st.empty()
+    with timer.stage("figures"):
+        fig_occ = go.Figure()
+        if occupancy_map is not None:
+            occupancy, centers = occupancy_map
+            fig_occ.add_trace(go.Heatmap(z=occupancy, x=centers, y=centers, colorscale='Hot', reversescale=True, colorbar=dict(title='Occupazione')))
+        fig_occ.add_trace(go.Contour(z=U_total, x=x_range, y=y_range, colorscale='Cividis', contours_coloring='lines', showscale=False, line_width=1, hoverinfo='skip'))
+        if show_field:
+            # Ritratto di fase: frecce della forza, confine del bacino di cattura, punti fissi
+            from pnei_phase import add_overlay
+            add_overlay(fig_occ, portrait)
+        fig_occ.update_layout(
+            xaxis_title='Struttura', yaxis_title='Funzione',
+            yaxis=dict(scaleanchor='x'),
+            height=450,
+            margin=dict(l=0, r=0, b=0, t=20)
+        )
+    with timer.stage("serialization"):
+        st.plotly_chart(fig_occ, use_container_width=True)
+    if job is None:
+        st.caption(f"{n_paths} traiettorie × {steps + 1} istanti: più scuro = più tempo trascorso nella cella.")
+    else:
+        st.caption("Mostro l'ultima mappa completata mentre il nuovo ensemble è in calcolo.")
+    if show_field:
+        from pnei_phase import basin_caption
+        st.caption(basin_caption(portrait, (1.5, 1.5)))
 
 with col2:
     st.subheader("Analisi Pragmatica")
@@ -162,10 +191,12 @@ with col2:
     * **Profondità (Resilienza):** {depth}
     """)
     
-    dist_data = np.sqrt(np.array(traj_x)**2 + np.array(traj_y)**2)
+    dist_data = np.sqrt(traj_x**2 + traj_y**2)
     
-    # Grafico a linee semplice
-    st.line_chart(pd.DataFrame(dist_data, columns=["Distanza dall'Equilibrio"]))
+    # Grafico a linee semplice (DataFrame sopra l'array, senza copia; pandas importato solo qui)
+    import pandas as pd
+    with timer.stage("serialization"):
+        st.line_chart(pd.DataFrame(dist_data, columns=["Distanza dall'Equilibrio"], copy=False))
     
     avg_dist = np.mean(dist_data[-100:])
     
@@ -183,4 +214,7 @@ with col2:
     Se prendiamo un soggetto "Normale" e aumentiamo il **Carico Allostatico (Slider Rumore)** a livelli estremi, il suo tracciato diventerà indistinguibile da quello di un profilo clinico. 
     
     *La patologia non è una classe diversa di esseri umani, è lo stesso sistema umano sotto condizioni limite.*
-    """)
\ No newline at end of file
+    """)
+
+finish(timer, __file__)
+follow_all([(job, ensemble_status, f"Simulazione di {n_paths:,} traiettorie…")], st.rerun)
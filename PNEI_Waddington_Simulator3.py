@@ -1,20 +1,34 @@
 import streamlit as st
 import numpy as np
-import plotly.graph_objects as go
-import pandas as pd
+
+from pnei_engine import DISPLAY_DTYPE, ExtendablePath1D, potential_1d as potential, simulate_1d
+from pnei_profiling import LABELS, finish, profiling_controls
+from pnei_recompute import RecomputeGraph
+from pnei_worker import discard, follow_all, request
 
 # --- SETUP ---
 st.set_page_config(layout="wide", page_title="Laboratorio Topologia PNEI")
 
-# Inizializza session_state per i parametri
-if 'width' not in st.session_state:
-    st.session_state.width = 1.5
-if 'depth' not in st.session_state:
-    st.session_state.depth = 1.5
-if 'noise' not in st.session_state:
-    st.session_state.noise = 0.5
-if 'sim_duration' not in st.session_state:
-    st.session_state.sim_duration = 1000
+# Inizializza session_state per i parametri (sono le chiavi degli slider:
+# i preset le scrivono direttamente, prima del rerun)
+if 'width_slider' not in st.session_state:
+    st.session_state.width_slider = 1.5
+if 'depth_slider' not in st.session_state:
+    st.session_state.depth_slider = 1.5
+if 'noise_slider' not in st.session_state:
+    st.session_state.noise_slider = 0.5
+if 'duration_slider' not in st.session_state:
+    st.session_state.duration_slider = 1000
+
+# Grafo delle dipendenze: ogni fase viene ricalcolata solo se cambiano i suoi input
+graph = st.session_state.setdefault("graph", RecomputeGraph()).start_run()
+
+def apply_preset(width, depth, noise, message):
+    """Callback dei preset: gira prima del rerun del bottone, quindi nessun st.rerun() extra."""
+    st.session_state.width_slider = width
+    st.session_state.depth_slider = depth
+    st.session_state.noise_slider = noise
+    st.toast(message)
 
 st.title("🧪 Modello Dinamico del Paesaggio Epigenetico PNEI")
 st.markdown("""
@@ -40,91 +54,100 @@ with st.sidebar:
     col_a, col_b, col_c = st.columns(3)
     
     with col_a:
-        if st.button("🟢 Baseline", use_container_width=True, help="Stato di riposo, condizioni ottimali"):
-            st.session_state.width = 1.5
-            st.session_state.depth = 1.5
-            st.session_state.noise = 0.5
-            st.toast("✅ Stato: Omeostasi Bilanciata")
-            st.rerun()
+        st.button("🟢 Baseline", use_container_width=True, help="Stato di riposo, condizioni ottimali",
+                  on_click=apply_preset, args=(1.5, 1.5, 0.5, "✅ Stato: Omeostasi Bilanciata"))
     
     with col_b:
-        if st.button("🔵 Rigidità", use_container_width=True, help="Ipervigilanza, burnout, trauma"):
-            st.session_state.width = 0.8
-            st.session_state.depth = 4.0
-            st.session_state.noise = 0.4
-            st.toast("✅ Stato: Canalizzazione Rigida")
-            st.rerun()
+        st.button("🔵 Rigidità", use_container_width=True, help="Ipervigilanza, burnout, trauma",
+                  on_click=apply_preset, args=(0.8, 4.0, 0.4, "✅ Stato: Canalizzazione Rigida"))
     
     with col_c:
-        if st.button("🟡 Dispersione", use_container_width=True, help="Sovraccarico, privazione sonno, stress"):
-            st.session_state.width = 3.0
-            st.session_state.depth = 0.5
-            st.session_state.noise = 0.8
-            st.toast("✅ Stato: Instabilità Dispersiva")
-            st.rerun()
+        st.button("🟡 Dispersione", use_container_width=True, help="Sovraccarico, privazione sonno, stress",
+                  on_click=apply_preset, args=(3.0, 0.5, 0.8, "✅ Stato: Instabilità Dispersiva"))
     
     st.divider()
     
     st.header("1. Modella il Paesaggio")
     st.info("Questi parametri definiscono la struttura (Genetica/Apprendimento).")
     
-    width = st.slider("LARGHEZZA (Tolleranza)", 0.5, 5.0, st.session_state.width, 0.1,
+    width = st.slider("LARGHEZZA (Tolleranza)", 0.5, 5.0, step=0.1,
                       key="width_slider",
                       help="Quanto è larga la valle? Stretta = Rigida. Larga = Dispersiva.")
     
-    depth = st.slider("PROFONDITÀ (Attrazione)", 0.1, 5.0, st.session_state.depth, 0.1,
+    depth = st.slider("PROFONDITÀ (Attrazione)", 0.1, 5.0, step=0.1,
                       key="depth_slider",
                       help="Quanto è ripida la discesa? Alta = Forte ritorno all'equilibrio. Bassa = Instabilità.")
     
     st.header("2. Aggiungi Stress")
     st.info("Questi parametri definiscono l'ambiente attuale.")
     
-    noise = st.slider("RUMORE (Stress/Caos)", 0.0, 3.0, st.session_state.noise, 0.1,
+    noise = st.slider("RUMORE (Stress/Caos)", 0.0, 3.0, step=0.1,
                       key="noise_slider",
                       help="Quanto 'trema' il sistema? Rappresenta input sensoriali, ansia, eventi esterni.")
     
-    sim_duration = st.slider("Durata Osservazione", 100, 2000, st.session_state.sim_duration,
+    sim_duration = st.slider("Durata Osservazione", 100, 2000,
                               key="duration_slider")
     
-    # Aggiorna session_state con i valori correnti degli slider
-    st.session_state.width = width
-    st.session_state.depth = depth
-    st.session_state.noise = noise
-    st.session_state.sim_duration = sim_duration
+    n_paths = st.select_slider("Ensemble (Persone Virtuali)", [1, 100, 1000, 10000], value=1,
+                               help="Oltre 1, il grafico temporale mostra la densità dell'intero ensemble.")
+    
+    timer = profiling_controls(st.sidebar, st.session_state, LABELS["it"])
 
 # --- LOGICA MATEMATICA ---
 
-# 1. Creiamo lo Spazio
-x = np.linspace(-5, 5, 200)
-X, Y = np.meshgrid(np.linspace(-5, 5, 50), np.linspace(-5, 5, 50))
-
-# 2. Funzione Potenziale (La forma della valle)
-# U(x) = -Depth * exp(-x^2 / Width)
-# Aggiungiamo x^4 per creare i "muri" esterni (limiti biologici vitali)
-def potential(val, w, d):
-    return -d * np.exp(-(val**2) / (2 * w**2)) + 0.02 * val**4
-
-U_1D = potential(x, width, depth)
-U_2D = potential(np.sqrt(X**2 + Y**2), width, depth)
-
-# 3. Simulazione Dinamica (La Pallina)
-traj = []
-pos = 1.5 # Partiamo spostati dal centro
-np.random.seed(42)
-
-for _ in range(sim_duration):
-    # Forza = Derivata negativa del potenziale (la gravità che ti spinge giù)
-    # d/dx di (-A * exp(-x^2/B)) = x * (2A/B) * exp(...)
-    force = -(pos * (depth / width**2)) * np.exp(-(pos**2) / (2 * width**2)) - 0.08 * pos**3
+with timer.stage("grid"):
+    # 1. Creiamo lo Spazio (non dipende da nessun parametro)
+    x, X, Y = graph.node("grid", (), lambda: (
+        np.linspace(-5, 5, 200),
+        *np.meshgrid(np.linspace(-5, 5, 50), np.linspace(-5, 5, 50)),
+    ))
+    
+    # 2. Funzione Potenziale (La forma della valle), dipende solo da larghezza e profondità
+    # U(x) = -Depth * exp(-x^2 / Width)
+    # Aggiungiamo x^4 per creare i "muri" esterni (limiti biologici vitali)
+    U_1D, U_2D = graph.node("landscape", (width, depth), lambda: (
+        potential(x, width, depth),
+        potential(np.sqrt(X**2 + Y**2), width, depth),
+    ))
+
+def ensemble_density(w, d, n, steps, n_paths, progress=None):
+    """Bande di quantili, densità tempo × posizione e dispersione media dell'ensemble."""
+    from pnei_density import quantile_bands, time_position_histogram
+
+    ens = simulate_1d(w, d, n, steps, x0=1.5, n_paths=n_paths, seed=42, dtype=DISPLAY_DTYPE, progress=progress)
+    return quantile_bands(ens), *time_position_histogram(ens), float(np.mean(np.abs(ens), dtype=np.float64))
+
+with timer.stage("physics"):
+    # 3. Simulazione Dinamica (La Pallina)
+    # Forza = Derivata negativa del potenziale, Movimento = Forza + Rumore Casuale.
+    # Il motore scrive direttamente in un array preallocato (niente liste Python).
+    # Il percorso dipende da larghezza, profondità e rumore; allungare la durata
+    # continua la traiettoria esistente, accorciarla ne prende un prefisso.
+    path = graph.node("trajectory", (width, depth, noise), lambda: ExtendablePath1D(width, depth, noise, x0=1.5, seed=42))
+    traj = path.get(sim_duration)
+    
+    # L'ensemble gira nel worker in background: la pagina mostra l'ultimo
+    # risultato completato finché il nuovo non è pronto.
+    ensemble_slot = st.session_state.setdefault("ensemble", {})
+    ensemble = job = None
+    if n_paths > 1:
+        ensemble, job = request(ensemble_slot, ensemble_density, width, depth, noise, sim_duration, n_paths)
+    else:
+        discard(ensemble_slot)
     
-    # Movimento = Forza + Rumore Casuale
-    displacement = force * 0.05 + noise * np.sqrt(0.05) * np.random.normal()
-    pos += displacement
-    traj.append(pos)
-
-traj = np.array(traj)
+    # Calcolo stabilità: sull'intero ensemble solo se è quello dei parametri
+    # attuali; mentre il nuovo è in calcolo, metrica e verdetto usano il
+    # percorso singolo (l'ensemble precedente resta solo nel grafico).
+    deviazione_media = graph.node("metrics", (width, depth, noise, sim_duration), lambda: np.mean(np.abs(traj)))
+    if ensemble is not None:
+        bands, density, t_centers, x_centers, deviazione_ensemble = ensemble
+        if job is None:
+            deviazione_media = deviazione_ensemble
 
 # --- VISUALIZZAZIONE ---
+# Import differito: plotly serve solo quando si costruiscono i grafici, così titolo,
+# sidebar e fisica arrivano al browser prima del suo caricamento.
+import plotly.graph_objects as go
 
 # LAYOUT: Riga 1 (2D Cross Section + Time Series), Riga 2 (3D)
 col1, col2 = st.columns([1, 1])
@@ -133,25 +156,27 @@ with col1:
     st.subheader("1. Vista in Sezione (Profilo 2D)")
     st.caption("Immagina di tagliare la sfera a metà. Questa è la forma della 'buca'.")
     
-    fig_2d = go.Figure()
-    
-    # Disegna la montagna/valle
-    fig_2d.add_trace(go.Scatter(x=x, y=U_1D, mode='lines', name='Paesaggio', line=dict(color='gray', width=2), fill='tozeroy'))
-    
-    # Disegna la pallina (posizione finale)
-    final_energy = potential(traj[-1], width, depth)
-    fig_2d.add_trace(go.Scatter(x=[traj[-1]], y=[final_energy], mode='markers', name='TU (Ora)', marker=dict(size=15, color='red')))
-    
-    # Annotazioni dinamiche
-    fig_2d.add_annotation(x=0, y=min(U_1D), text="Omeostasi (Centro)", showarrow=True, arrowhead=1)
-    
-    fig_2d.update_layout(
-        yaxis_title="Energia Potenziale (Sforzo)",
-        xaxis_title="Stato (Deviazione dalla norma)",
-        height=350,
-        margin=dict(l=20, r=20, t=30, b=20)
-    )
-    st.plotly_chart(fig_2d, use_container_width=True)
+    with timer.stage("figures"):
+        fig_2d = go.Figure()
+        
+        # Disegna la montagna/valle
+        fig_2d.add_trace(go.Scatter(x=x, y=U_1D, mode='lines', name='Paesaggio', line=dict(color='gray', width=2), fill='tozeroy'))
+        
+        # Disegna la pallina (posizione finale)
+        final_energy = potential(traj[-1], width, depth)
+        fig_2d.add_trace(go.Scatter(x=[traj[-1]], y=[final_energy], mode='markers', name='TU (Ora)', marker=dict(size=15, color='red')))
+        
+        # Annotazioni dinamiche
+        fig_2d.add_annotation(x=0, y=min(U_1D), text="Omeostasi (Centro)", showarrow=True, arrowhead=1)
+        
+        fig_2d.update_layout(
+            yaxis_title="Energia Potenziale (Sforzo)",
+            xaxis_title="Stato (Deviazione dalla norma)",
+            height=350,
+            margin=dict(l=20, r=20, t=30, b=20)
+        )
+    with timer.stage("serialization"):
+        st.plotly_chart(fig_2d, use_container_width=True)
     
     # Spiegazione contestuale
     if width < 1.0:
@@ -164,24 +189,33 @@ with col1:
 with col2:
     st.subheader("2. Comportamento nel Tempo")
     st.caption("Dove si trova la pallina momento per momento?")
-    
-    df_traj = pd.DataFrame({'Tempo': range(len(traj)), 'Posizione': traj})
-    
-    # Coloriamo le zone di pericolo
-    fig_time = go.Figure()
-    fig_time.add_trace(go.Scatter(x=df_traj['Tempo'], y=df_traj['Posizione'], mode='lines', line=dict(color='blue', width=1)))
-    
-    # Zone di soglia
-    fig_time.add_hrect(y0=-0.5, y1=0.5, fillcolor="green", opacity=0.1, line_width=0, annotation_text="Zona Comfort")
-    fig_time.add_hrect(y0=2.5, y1=5, fillcolor="red", opacity=0.1, line_width=0, annotation_text="Patologia/Crani")
-    fig_time.add_hrect(y0=-5, y1=-2.5, fillcolor="red", opacity=0.1, line_width=0)
-    
-    fig_time.update_layout(height=350, yaxis_range=[-4, 4], yaxis_title="Posizione", margin=dict(l=20, r=20, t=30, b=20))
-    st.plotly_chart(fig_time, use_container_width=True)
-    
-    # Calcolo stabilità
-    deviazione_media = np.mean(np.abs(traj))
-    st.metric("Carico Allostatico (Dispersione)", f"{deviazione_media:.2f}", delta="Più basso = Omeostasi")
+    ensemble_status = st.empty()
+    
+    with timer.stage("figures"):
+        fig_time = go.Figure()
+        if ensemble is None:
+            fig_time.add_trace(go.Scatter(y=traj, mode='lines', line=dict(color='blue', width=1)))
+        else:
+            # Ensemble: densità tempo × posizione, bande 5–95% / 25–75% e mediana
+            fig_time.add_trace(go.Heatmap(z=density, x=t_centers, y=x_centers, colorscale='Blues', showscale=False, hoverinfo='skip'))
+            for lo, hi in ((0, 4), (1, 3)):
+                fig_time.add_trace(go.Scatter(y=bands[lo], mode='lines', line=dict(width=0), hoverinfo='skip'))
+                fig_time.add_trace(go.Scatter(y=bands[hi], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(0, 0, 255, 0.15)', hoverinfo='skip'))
+            fig_time.add_trace(go.Scatter(y=bands[2], mode='lines', name='Mediana', line=dict(color='navy', width=1.5)))
+        
+        # Coloriamo le zone di pericolo (zone di soglia)
+        fig_time.add_hrect(y0=-0.5, y1=0.5, fillcolor="green", opacity=0.1, line_width=0, annotation_text="Zona Comfort")
+        fig_time.add_hrect(y0=2.5, y1=5, fillcolor="red", opacity=0.1, line_width=0, annotation_text="Patologia/Crani")
+        fig_time.add_hrect(y0=-5, y1=-2.5, fillcolor="red", opacity=0.1, line_width=0)
+        
+        fig_time.update_layout(height=350, yaxis_range=[-4, 4], yaxis_title="Posizione", margin=dict(l=20, r=20, t=30, b=20), showlegend=False)
+    with timer.stage("serialization"):
+        st.plotly_chart(fig_time, use_container_width=True)
+    if job is not None:
+        st.caption("Mostro l'ultima simulazione completata mentre il nuovo ensemble è in calcolo.")
+    
+    st.metric("Carico Allostatico (Dispersione)", f"{deviazione_media:.2f}", delta="Più basso = Omeostasi",
+              help="Percorso singolo finché il nuovo ensemble non è pronto." if job is not None else None)
     
     # Interpretazione pragmatica
     if deviazione_media > 2.0:
@@ -195,6 +229,14 @@ with col2:
 st.subheader("3. Vista Globale 3D")
 st.caption("La visione d'insieme del tuo modello sferico/topologico.")
 
-fig_3d = go.Figure(data=[go.Surface(z=U_2D, x=X, y=Y, colorscale='Viridis', opacity=0.9)])
-fig_3d.update_layout(height=500, scene=dict(zaxis=dict(range=[-5, 2])))
-st.plotly_chart(fig_3d, use_container_width=True)
\ No newline at end of file
+with timer.stage("figures"):
+    # Come il paesaggio, la superficie 3D dipende solo da larghezza e profondità
+    fig_3d = graph.node("figure_3d", (width, depth), lambda: go.Figure(
+        data=[go.Surface(z=U_2D, x=X, y=Y, colorscale='Viridis', opacity=0.9)],
+        layout=dict(height=500, scene=dict(zaxis=dict(range=[-5, 2]))),
+    ))
+with timer.stage("serialization"):
+    st.plotly_chart(fig_3d, use_container_width=True)
+
+finish(timer, __file__, recomputed=graph.recomputed)
+follow_all([(job, ensemble_status, f"Simulazione di {n_paths:,} persone virtuali…")], st.rerun)
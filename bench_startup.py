@@ -0,0 +1,134 @@
+"""
+Cold-start benchmark for the PNEI Waddington simulators.
+
+Runs ``python -X importtime`` in fresh interpreters to measure:
+1. the import cost of each heavy dependency (startup profile);
+2. the eager (module-level) imports of every simulator, i.e. what a cold
+   container or a freshly autoscaled replica pays before the first page
+   element is sent to the browser.
+
+Usage:
+    python bench_startup.py            # print the report
+    python bench_startup.py --check    # also fail (exit 1) if a simulator
+                                       # eagerly imports a deferred module
+"""
+import ast
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+SIMULATORS = [
+    "PNEI_Waddington_Simulator.py",
+    "PNEI_Waddington_Simulator1.py",
+    "PNEI_Waddington_Simulator2.py",
+    "PNEI_Waddington_Simulator3.py",
+]
+
+DEPENDENCIES = ["streamlit", "numpy", "pandas", "plotly.graph_objects", "pnei_engine", "pnei_density", "pnei_profiling", "pnei_recompute", "pnei_phase", "pnei_sensitivity", "pnei_worker", "pnei_design", "pnei_cohort", "pnei_spectral"]
+
+# Modules that must only be imported when the corresponding view is rendered.
+# Recent Streamlit releases preload plotly themselves; a module only counts as
+# eager if the simulator's own imports load it on top of ``import streamlit``.
+DEFERRED = ["pandas", "plotly.graph_objects"]
+
+
+def import_profile(code):
+    """
+    Run ``code`` under ``-X importtime`` in a fresh interpreter.
+
+    Returns ``{module: (self_us, cumulative_us)}``, module names indented by
+    nesting level as printed by ``-X importtime``, and the set of modules
+    loaded once ``code`` has run.
+    """
+    probe = code + "\nimport sys\nprint('\\n'.join(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile[name[1:]] = (int(self_us), int(cumulative_us))  # keep the nesting indent
+    return profile, set(result.stdout.split())
+
+
+def eager_imports(path):
+    """
+    The leading block of ``import`` statements of a script.
+
+    Returns ``(source, modules)``. Collection stops at the first other
+    statement (a module docstring excepted): imports after it, such as
+    ``import plotly.graph_objects`` at the start of the visualisation
+    section, are deferred by design.
+    """
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    statements = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            statements.append(node)
+        elif not (not statements and isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)):
+            break
+    modules = {alias.name if isinstance(node, ast.Import) else node.module
+               for node in statements for alias in node.names}
+    return "\n".join(ast.unparse(node) for node in statements), modules
+
+
+def top_level_total(profile):
+    """Total import time, summing only modules imported at nesting level 0."""
+    return sum(cumulative for name, (_, cumulative) in profile.items() if name == name.lstrip())
+
+
+def main():
+    check = "--check" in sys.argv[1:]
+    failures = []
+
+    print("=" * 60)
+    print("PNEI Waddington Simulator - Cold-Start Benchmark")
+    print("=" * 60)
+    print(f"\nPython Version: {sys.version.split()[0]}\n")
+
+    print("Dependency import cost (cumulative, fresh interpreter)")
+    print("-" * 60)
+    for module in DEPENDENCIES:
+        try:
+            profile, _ = import_profile(f"import {module}")
+        except subprocess.CalledProcessError:
+            print(f"{module:<28} not installed")
+            continue
+        print(f"{module:<28} {top_level_total(profile) / 1000:8.1f} ms")
+
+    _, preloaded = import_profile("import streamlit")
+    print("\nSimulator eager imports (before the first element is rendered)")
+    print("-" * 60)
+    for module in DEFERRED:
+        if module in preloaded:
+            print(f"note: {module} is already imported by streamlit itself")
+    for script in SIMULATORS:
+        source, modules = eager_imports(ROOT / script)
+        profile, loaded = import_profile(source)
+        # Named in the eager block, or pulled in by it on top of streamlit
+        eager_deferred = [module for module in DEFERRED
+                          if any(name == module or name.startswith(module + ".") for name in modules)
+                          or module in loaded - preloaded]
+        status = "✓" if not eager_deferred else "✗ eager: " + ", ".join(eager_deferred)
+        print(f"{script:<32} {top_level_total(profile) / 1000:8.1f} ms  {status}")
+        if eager_deferred:
+            failures.append(script)
+
+        slowest = sorted(profile.items(), key=lambda item: item[1][0], reverse=True)[:5]
+        for name, (self_us, _) in slowest:
+            print(f"    {name.strip():<40} self {self_us / 1000:6.1f} ms")
+
+    if check and failures:
+        print(f"\n❌ Deferred modules imported eagerly by: {', '.join(failures)}")
+        return 1
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+"""
+Numerical regression harness for the four PNEI Waddington simulators.
+
+Presenters rely on the exact seed-42 trajectories of every preset, so any
+change to the integrators (vectorization, block draws, dtypes, a JIT
+engine) must reproduce them. This script runs the physics of each
+``PNEI_Waddington_Simulator*.py`` headlessly, with a minimal stand-in for
+Streamlit whose widgets return their defaults or the preset values, and
+compares against the golden outputs pinned in ``regression_golden.json``:
+
+1. **single trajectories** (same RNG stream, default widget values): exact. The SHA-256 of the
+   float64 trajectory must match, otherwise every sampled row is compared
+   and the run fails unless ``--tolerance`` allows the difference (e.g. for a
+   JIT engine that reorders floating-point operations);
+2. **metrics and verdicts** shown by the app (``st.metric`` values,
+   success / warning / error messages): exact text;
+3. **ensembles** (a second run of the preset with 1,000 paths, through
+   ``pnei_worker`` inline with ``PNEI_SYNC=1``): statistical. Every ``simulate_1d`` / ``simulate_2d``
+   ensemble call made by the script is reduced to per-path final distance
+   and mean distance from equilibrium, and their mean (z-test) and SD
+   (log-ratio test) must agree with the golden ones within ``Z_LIMIT``
+   standard errors, so an engine drawing the noise in a different order
+   still passes.
+
+The golden outputs start at the shared ``pnei_engine`` integrator, not at
+the per-script loops the presenters used before it: pinning those would make
+the exact check fail on a difference nobody can see. Against those loops the
+pinned trajectories are bit-identical for every preset, except Simulator1's
+"Neurotipico (Bilanciato)", which differs by at most 2.2e-16 (1 ULP). The old
+Simulator1 loop evaluated the drift as ``(x / width²) · depth``, while the
+engine shares Simulator2's ``(x · depth) / width²``. One expression cannot
+reproduce both orders, and the metrics and verdicts shown are the same.
+
+Usage:
+    python check_regression.py                 # check every simulator
+    python check_regression.py --update        # re-pin the golden outputs
+    python check_regression.py --tolerance 1e-9 PNEI_Waddington_Simulator3.py
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import runpy
+import sys
+import types
+from pathlib import Path
+
+import numpy as np
+
+os.environ["PNEI_SYNC"] = "1"  # ensembles inline and deterministic, before pnei_worker is used
+
+ROOT = Path(__file__).resolve().parent
+GOLDEN = ROOT / "regression_golden.json"
+ENSEMBLE_PATHS = 1000
+SAMPLE_EVERY = 25
+Z_LIMIT = 4.0
+
+# Presets per simulator: widget values by label, or session_state values by key (Simulator3)
+SIMULATORS = {
+    "PNEI_Waddington_Simulator.py": {
+        "trajectory": "traj",
+        "ensemble_widget": "Ensemble Size (Virtual Participants)",
+        "presets": {
+            f"{profile} | {condition}": {"widgets": {"Population": profile, "Environment": condition}}
+            for profile in ("Neurotypical (NT)", "ASD-like (Rigid)", "ADHD-like (Dispersed)")
+            for condition in ("G3: Book (Control)", "G1: Human Tutor", "G4: LLM (Active)")
+        },
+    },
+    "PNEI_Waddington_Simulator1.py": {
+        "trajectory": "traj",
+        "ensemble_widget": "Ensemble (Mappa di Occupazione)",
+        "presets": {
+            profile: {"widgets": {"Seleziona Neuroprofilo": profile}}
+            for profile in ("Neurotipico (Bilanciato)", "ASD (Iper-Canalizzato/Rigido)", "ADHD (Instabile/Piatto)")
+        },
+    },
+    "PNEI_Waddington_Simulator2.py": {
+        "trajectory": "traj",
+        "ensemble_widget": "Ensemble (Mappa di Occupazione)",
+        "presets": {
+            state: {"widgets": {"Seleziona lo Stato del Sistema (Snapshot)": state}}
+            for state in ("Stato Basale (Equilibrio/Neurotipico)", "Stato Iper-Rigido (Pattern ASD o Stress Cronico)",
+                          "Stato Iper-Labile (Pattern ADHD o Esaurimento)", "Transizione Critica (Punto di Rottura)")
+        },
+    },
+    "PNEI_Waddington_Simulator3.py": {
+        "trajectory": "traj",
+        "ensemble_widget": "Ensemble (Persone Virtuali)",
+        "presets": {
+            name: {"session": {"width_slider": w, "depth_slider": d, "noise_slider": n}}
+            for name, (w, d, n) in {"Baseline": (1.5, 1.5, 0.5), "Rigidità": (0.8, 4.0, 0.4),
+                                    "Dispersione": (3.0, 0.5, 0.8)}.items()
+        },
+    },
+}
+
+
+# --- STREAMLIT STAND-IN ---
+class _SessionState(dict):
+    """``st.session_state``: a dict that also allows attribute access."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class _Container:
+    """``st.sidebar``, columns, expanders, ``st.empty()``: forward every call to the module."""
+
+    def __init__(self, st):
+        self._st = st
+
+    def __getattr__(self, name):
+        return getattr(self._st, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Rerun(Exception):
+    """``st.rerun()``: stops the script, as in Streamlit."""
+
+
+def make_streamlit(widgets, session):
+    """
+    A ``streamlit`` module stand-in.
+
+    Widgets return ``session[key]`` if set, else ``widgets[label]``, else
+    their default; buttons are never pressed. Metrics and status messages are
+    recorded in ``st.record``; every other element is a no-op.
+    """
+    st = types.ModuleType("streamlit")
+    st.session_state = _SessionState(session)
+    st.record = {"metrics": [], "messages": []}
+
+    def widget(default):
+        def call(label, *args, key=None, **kwargs):
+            if key is not None and key in st.session_state:
+                value = st.session_state[key]
+            elif label in widgets:
+                value = widgets[label]
+            else:
+                value = default(*args, **kwargs)
+            if key is not None:
+                st.session_state[key] = value
+            return value
+        return call
+
+    def options_default(options=(), index=0, **kwargs):
+        return list(options)[index]
+
+    def slider_default(min_value=None, max_value=None, value=None, step=None, *args, **kwargs):
+        return min_value if value is None else value
+
+    def select_slider_default(options=(), value=None, **kwargs):
+        return list(options)[0] if value is None else value
+
+    st.slider = widget(slider_default)
+    st.select_slider = widget(select_slider_default)
+    st.selectbox = st.radio = widget(options_default)
+    st.checkbox = st.toggle = widget(lambda value=False, *args, **kwargs: value)
+    st.button = widget(lambda *args, **kwargs: False)
+    st.number_input = widget(lambda min_value=None, max_value=None, value=None, *args, **kwargs:
+                             min_value if value is None else value)
+
+    def metric(label, value, *args, **kwargs):
+        st.record["metrics"].append([label, str(value)])
+
+    def message(kind):
+        return lambda body, *args, **kwargs: st.record["messages"].append([kind, str(body)])
+
+    def cache_data(func=None, **kwargs):
+        return func if func is not None else (lambda f: f)
+
+    def columns(spec, *args, **kwargs):
+        return [_Container(st) for _ in range(spec if isinstance(spec, int) else len(spec))]
+
+    def rerun(*args, **kwargs):
+        raise _Rerun()
+
+    st.metric = metric
+    st.success, st.warning, st.error = message("success"), message("warning"), message("error")
+    st.cache_data = st.cache_resource = cache_data
+    st.columns = columns
+    st.rerun = rerun
+    st.sidebar = _Container(st)
+    for name in ("expander", "container", "empty", "spinner", "tabs", "form", "status"):
+        setattr(st, name, lambda *args, **kwargs: _Container(st))
+
+    def __getattr__(name):  # markdown, plotly_chart, toast, ...: no-op
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+    st.__getattr__ = __getattr__
+    return st
+
+
+# --- ENSEMBLE RECORDING ---
+def ensemble_summary(ens):
+    """Per-path final and mean distance from equilibrium of a (steps, n_paths[, 2]) ensemble."""
+    ens = np.asarray(ens, dtype=np.float64)
+    dist = np.abs(ens) if ens.ndim == 2 else np.hypot(ens[..., 0], ens[..., 1])
+    return {name: [float(values.mean()), float(values.std(ddof=1)), len(values)]
+            for name, values in (("final", dist[-1]), ("mean", dist.mean(axis=0)))}
+
+
+@contextlib.contextmanager
+def record_ensembles(script, calls):
+    """Summarize every ensemble ``simulate_1d`` / ``simulate_2d`` call made from ``script``."""
+    import pnei_engine
+
+    originals = {name: getattr(pnei_engine, name) for name in ("simulate_1d", "simulate_2d")}
+
+    def recorder(name, func):
+        def call(*args, **kwargs):
+            result = func(*args, **kwargs)
+            if kwargs.get("n_paths") and sys._getframe(1).f_code.co_filename == str(script):
+                calls.append({"function": name, **ensemble_summary(result)})
+            return result
+        return call
+
+    for name, func in originals.items():
+        setattr(pnei_engine, name, recorder(name, func))
+    try:
+        yield
+    finally:
+        for name, func in originals.items():
+            setattr(pnei_engine, name, func)
+
+
+def run_preset(script, config, preset, n_paths=None):
+    """
+    Run one simulator headlessly; returns its trajectory, metrics, messages and ensembles.
+
+    ``n_paths`` overrides the ensemble size widget (default: the app's own).
+    """
+    import pnei_worker
+
+    path = ROOT / script
+    widgets = dict(preset.get("widgets", {}))
+    if n_paths is not None:
+        widgets[config["ensemble_widget"]] = n_paths
+    st = make_streamlit(widgets, preset.get("session", {}))
+    pnei_worker._worker = None  # fresh result cache: every run simulates its ensembles
+    ensembles = []
+    saved = sys.modules.get("streamlit")
+    sys.modules["streamlit"] = st
+    try:
+        with record_ensembles(path, ensembles), contextlib.redirect_stdout(io.StringIO()):
+            try:
+                namespace = runpy.run_path(str(path), run_name="__main__")
+            except _Rerun:
+                raise RuntimeError(f"{script} requested a rerun: an ensemble did not complete inline")
+    finally:
+        if saved is None:
+            del sys.modules["streamlit"]
+        else:
+            sys.modules["streamlit"] = saved
+    return {
+        "trajectory": np.asarray(namespace[config["trajectory"]], dtype=np.float64),
+        "metrics": st.record["metrics"],
+        "messages": st.record["messages"],
+        "ensembles": ensembles,
+    }
+
+
+# --- GOLDEN OUTPUTS ---
+def pin(result):
+    """JSON-serializable golden record of a run (trajectory hash plus sampled rows)."""
+    traj = result["trajectory"]
+    return {
+        "trajectory": {
+            "shape": list(traj.shape),
+            "sha256": hashlib.sha256(np.ascontiguousarray(traj).tobytes()).hexdigest(),
+            "samples": traj[::SAMPLE_EVERY].tolist(),
+            "final": traj[-1].tolist(),
+        },
+        "metrics": result["metrics"],
+        "messages": result["messages"],
+        "ensembles": result["ensembles"],
+    }
+
+
+def compare(golden, result, tolerance=0.0):
+    """List of failures of ``result`` against its ``golden`` record (empty if it matches)."""
+    failures = []
+    traj, pinned = result["trajectory"], golden["trajectory"]
+    if list(traj.shape) != pinned["shape"]:
+        failures.append(f"trajectory shape {list(traj.shape)} != {pinned['shape']}")
+    elif hashlib.sha256(np.ascontiguousarray(traj).tobytes()).hexdigest() != pinned["sha256"]:
+        diff = max(np.max(np.abs(traj[::SAMPLE_EVERY] - np.array(pinned["samples"]))),
+                   np.max(np.abs(traj[-1] - np.array(pinned["final"]))))
+        if diff > tolerance:
+            failures.append(f"trajectory differs (max |Δ| = {diff:.3g} on sampled rows, tolerance {tolerance:g})")
+
+    for kind in ("metrics", "messages"):
+        if result[kind] != golden[kind]:
+            failures.append(f"{kind} {result[kind]} != {golden[kind]}")
+
+    if len(result["ensembles"]) != len(golden["ensembles"]):
+        failures.append(f"{len(result['ensembles'])} ensemble calls, expected {len(golden['ensembles'])}")
+    for new, old in zip(result["ensembles"], golden["ensembles"]):
+        for stat in ("final", "mean"):
+            (m1, s1, n1), (m0, s0, n0) = new[stat], old[stat]
+            z = abs(m1 - m0) / max(np.sqrt(s1**2 / n1 + s0**2 / n0), 1e-12)
+            # log SD ratio: standard error ≈ sqrt(1 / 2(n1 - 1) + 1 / 2(n0 - 1))
+            z_sd = abs(np.log(max(s1, 1e-12) / max(s0, 1e-12))) / np.sqrt(0.5 / (n1 - 1) + 0.5 / (n0 - 1))
+            if z > Z_LIMIT or z_sd > Z_LIMIT:
+                failures.append(f"{old['function']} ensemble {stat} distance: mean {m1:.4f} vs {m0:.4f} "
+                                f"(z = {z:.1f}), SD {s1:.4f} vs {s0:.4f} (z = {z_sd:.1f})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the simulators against their pinned numerical outputs.")
+    parser.add_argument("scripts", nargs="*", help="simulators to check (default: all)")
+    parser.add_argument("--update", action="store_true", help="re-pin the golden outputs of the selected simulators")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="max |Δ| allowed on trajectories whose hash differs (default: exact)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    scripts = args.scripts or list(SIMULATORS)
+    golden = json.loads(GOLDEN.read_text(encoding="utf-8")) if GOLDEN.exists() else {}
+
+    print("=" * 60)
+    print("PNEI Waddington Simulator - Numerical Regression Check")
+    print("=" * 60)
+
+    failed = 0
+    for script in scripts:
+        config = SIMULATORS[script]
+        print(f"\n{script}")
+        for name, preset in config["presets"].items():
+            # Defaults for the exact checks (what presenters see), then a large ensemble
+            result = run_preset(script, config, preset)
+            result["ensembles"] = run_preset(script, config, preset, ENSEMBLE_PATHS)["ensembles"]
+            if args.update:
+                golden.setdefault(script, {})[name] = pin(result)
+                print(f"  {name:<52} pinned")
+                continue
+            pinned = golden.get(script, {}).get(name)
+            failures = ["no golden output (run with --update)"] if pinned is None else compare(pinned, result, args.tolerance)
+            print(f"  {name:<52} {'✗' if failures else '✓'}")
+            for failure in failures:
+                print(f"      {failure}")
+            failed += bool(failures)
+
+    if args.update:
+        GOLDEN.write_text(json.dumps(golden, indent=1, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"\n✓ Wrote {GOLDEN.name}")
+        return 0
+    print(f"\n{'✗' if failed else '✓'} {failed} preset(s) differ" if failed else "\n✓ All presets match")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
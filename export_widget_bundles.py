@@ -0,0 +1,119 @@
+"""
+Export precomputed trajectory/landscape bundles for waddington_widget.html.
+
+The widget does no simulation: it replays what this script writes, so the
+static page shows exactly the dynamics of PNEI_Waddington_Simulator1.py
+(same engine, same seed, Gaussian noise, start (2.5, 2.5), walls 0.05).
+
+Every combination of the DEPTH x WIDTH x NOISE lattice is integrated for
+MAX_STEPS steps; shorter runs are prefixes of the same seeded path, so one
+trajectory per combination covers every "Simulation Steps" setting.
+
+Output (little-endian binary typed arrays + JSON manifest):
+    widget_bundles/manifest.json      lattice, quantization scales, metrics
+    widget_bundles/trajectories.bin   Int16  [depth][width][noise][step][x|y]
+    widget_bundles/landscapes.bin     Uint16 [depth][width][row][col]
+
+Usage:
+    python export_widget_bundles.py
+"""
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from pnei_engine import DT, SEED, potential_2d, simulate_2d
+
+OUT_DIR = Path(__file__).resolve().parent / "widget_bundles"
+
+# Parameter lattice: the widget sliders snap to these values (presets included)
+DEPTH = [0.5, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0]
+WIDTH = [0.6, 0.8, 1.0, 1.5, 2.0, 3.0, 4.0]
+NOISE = [0.0, 0.2, 0.4, 0.5, 0.8, 1.2, 2.0]
+STEPS = list(range(100, 801, 50))
+MAX_STEPS = STEPS[-1]
+
+# Same model as PNEI_Waddington_Simulator1.py
+START = (2.5, 2.5)
+WALL = 0.05
+BURN_IN = 100  # "Dispersione Media" ignores the initial transient
+
+GRID_SIZE = 40
+EXTENT = 4.0
+
+INT16_MAX = np.iinfo(np.int16).max
+UINT16_MAX = np.iinfo(np.uint16).max
+
+
+def quantize_trajectory(traj):
+    """Symmetric Int16 quantization; returns (codes, scale) with traj ≈ codes * scale."""
+    scale = max(float(np.abs(traj).max()), 1e-12) / INT16_MAX
+    return np.round(traj / scale).astype("<i2"), scale
+
+
+def quantize_landscape(U):
+    """Min/max Uint16 quantization; returns (codes, lo, hi) with U ≈ lo + codes * (hi - lo) / 65535."""
+    lo, hi = float(U.min()), float(U.max())
+    codes = np.round((U - lo) / max(hi - lo, 1e-12) * UINT16_MAX).astype("<u2")
+    return codes, lo, hi
+
+
+def main():
+    OUT_DIR.mkdir(exist_ok=True)
+    shape = (len(DEPTH), len(WIDTH), len(NOISE))
+
+    axis = np.linspace(-EXTENT, EXTENT, GRID_SIZE)
+    X, Y = np.meshgrid(axis, axis)
+
+    trajectories = np.empty(shape + (MAX_STEPS + 1, 2), dtype="<i2")
+    traj_scale = np.empty(shape)
+    avg_dist = np.empty(shape + (len(STEPS),))
+    landscapes = np.empty(shape[:2] + (GRID_SIZE, GRID_SIZE), dtype="<u2")
+    landscape_range = np.empty(shape[:2] + (2,))
+
+    print(f"Exporting {np.prod(shape)} combinations × {MAX_STEPS} steps...")
+    for i, depth in enumerate(DEPTH):
+        for j, width in enumerate(WIDTH):
+            landscapes[i, j], *landscape_range[i, j] = quantize_landscape(potential_2d(X, Y, width, depth, WALL))
+            for k, noise in enumerate(NOISE):
+                traj = simulate_2d(width, depth, noise, MAX_STEPS, start=START, seed=SEED)
+                trajectories[i, j, k], traj_scale[i, j, k] = quantize_trajectory(traj)
+
+                # Metric exactly as in the app, from the float64 trajectory
+                dist = np.sqrt(traj[:, 0]**2 + traj[:, 1]**2)
+                avg_dist[i, j, k] = [np.mean(dist[BURN_IN:steps + 1]) for steps in STEPS]
+
+    trajectories.tofile(OUT_DIR / "trajectories.bin")
+    landscapes.tofile(OUT_DIR / "landscapes.bin")
+
+    manifest = {
+        "version": 1,
+        "model": "PNEI_Waddington_Simulator1.py",
+        "dt": DT,
+        "seed": SEED,
+        "start": START,
+        "wall": WALL,
+        "burn_in": BURN_IN,
+        "depth": DEPTH,
+        "width": WIDTH,
+        "noise": NOISE,
+        "steps": STEPS,
+        "grid": {"size": GRID_SIZE, "extent": EXTENT},
+        "trajectories": {"file": "trajectories.bin", "dtype": "int16",
+                         "shape": list(trajectories.shape),
+                         "scale": traj_scale.tolist()},
+        "landscapes": {"file": "landscapes.bin", "dtype": "uint16",
+                       "shape": list(landscapes.shape),
+                       "range": landscape_range.tolist()},
+        "avg_dist": np.round(avg_dist, 4).tolist(),
+    }
+    (OUT_DIR / "manifest.json").write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+
+    size_kb = sum(f.stat().st_size for f in OUT_DIR.iterdir()) / 1024
+    print(f"✓ Wrote {OUT_DIR.name}/ ({size_kb:.0f} KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+Synthetic cohort generator for power analysis of the 3 × 3 PNEI design.
+
+Every cell of the design (Population × Environment) gets its own cohort of
+virtual participants. Each participant's width, depth and noise are drawn
+around the ``get_interaction_params`` baseline of the cell with
+multiplicative log-normal jitter (so parameters stay positive), and is
+simulated with the 1D landscape of PNEI_Waddington_Simulator.py.
+
+Participants are simulated in chunks, all paths of a chunk in lock-step
+(per-path parameter arrays), into one preallocated (steps, chunk) buffer
+reused across chunks. Randomness comes from fixed blocks of ``SEED_BLOCK``
+participants, each with its own stream, so the chunk size bounds memory
+without changing the sample. Each chunk is reduced at once to per-participant
+outcomes, which are merged into running group statistics (Chan et al.
+parallel mean/variance update), so memory is bounded by the chunk size and
+a 100,000-participant study runs on a laptop.
+
+Outcomes per participant, matching the zones drawn in the app:
+    allostatic_load  mean |x(t)|
+    comfort_time     fraction of time in |x| < 0.5  (High HRV zone)
+    spike_time       fraction of time in |x| > 2.5  (GSR spike / withdrawal zones)
+
+Group comparisons are Cohen's d (pooled SD) of every environment against the
+control (G3: Book) within each population, with an approximate 95% CI and
+the participants per group needed for 80% power (two-sided α = 0.05).
+
+Usage:
+    python pnei_cohort.py                        # 100,000 participants, 1,000 steps
+    python pnei_cohort.py --participants 9000 --steps 500 --chunk 2000 --json study.json
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from pnei_design import CONDITIONS, CONTROL, PROFILES, get_interaction_params
+from pnei_engine import DISPLAY_DTYPE, SEED, simulate_1d
+
+OUTCOMES = ("allostatic_load", "comfort_time", "spike_time")
+JITTER = 0.15          # log-normal sigma of the per-participant parameter jitter
+CHUNK_SIZE = 5000
+SEED_BLOCK = 500       # participants per RNG stream; chunks hold whole blocks
+X0 = 1.5
+
+Z_ALPHA = 1.959964     # two-sided α = 0.05
+Z_POWER = 0.841621     # power = 0.80
+
+
+class RunningStats:
+    """Count, mean and sum of squared deviations per outcome, merged chunk by chunk."""
+
+    def __init__(self, size):
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+
+    def update(self, values):
+        """Merge a (n, size) batch (Chan et al. parallel update)."""
+        n = len(values)
+        if not n:
+            return
+        batch_mean = values.mean(axis=0)
+        batch_m2 = ((values - batch_mean)**2).sum(axis=0)
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + batch_m2 + delta**2 * self.count * n / total
+        self.count = total
+
+    @property
+    def var(self):
+        """Sample variance (ddof=1)."""
+        return self.m2 / max(self.count - 1, 1)
+
+
+def sample_participants(width, depth, noise, n, rng, jitter=JITTER):
+    """Per-participant (width, depth, noise) arrays, log-normally jittered around the baseline."""
+    factors = np.exp(jitter * rng.standard_normal((3, n)) - jitter**2 / 2)  # mean-preserving
+    return width * factors[0], depth * factors[1], noise * factors[2]
+
+
+def participant_outcomes(traj):
+    """Outcomes of a (steps, n) trajectory block, shape (n, len(OUTCOMES))."""
+    dist = np.abs(traj)
+    return np.column_stack([
+        dist.mean(axis=0, dtype=np.float64),
+        (dist < 0.5).mean(axis=0),
+        (dist > 2.5).mean(axis=0),
+    ])
+
+
+def block_rng(seed, cell, block):
+    """Independent RandomState for one seed block of one cell (reproducible regardless of order)."""
+    return np.random.RandomState(np.random.SeedSequence([seed, cell, block]).generate_state(1)[0])
+
+
+class _BlockNoise:
+    """``RandomState`` facade joining the streams of consecutive seed blocks along the path axis."""
+
+    def __init__(self, parts):
+        self._parts = parts  # [(rng, n_paths), ...]
+
+    def standard_normal(self, shape):
+        steps = shape[0]
+        return np.concatenate([rng.standard_normal((steps, n)) for rng, n in self._parts], axis=1)
+
+
+def run_study(n_per_cell, steps=1000, chunk_size=CHUNK_SIZE, jitter=JITTER, seed=SEED, progress=None):
+    """
+    Simulate every design cell and aggregate the outcomes.
+
+    Returns ``{(profile, condition): RunningStats}``. ``progress``, if given,
+    is called as ``progress(done_participants, total_participants)`` after
+    every chunk. ``chunk_size`` is rounded to whole seed blocks and does not
+    affect the results.
+    """
+    if n_per_cell < 1:
+        raise ValueError("n_per_cell must be at least 1")
+    cells = [(profile, condition) for profile in PROFILES for condition in CONDITIONS]
+    chunk_size = min(max(1, chunk_size // SEED_BLOCK) * SEED_BLOCK, n_per_cell)
+    buffer = np.empty((steps, chunk_size), dtype=DISPLAY_DTYPE)
+    stats = {}
+    done, total = 0, n_per_cell * len(cells)
+
+    for c, (profile, condition) in enumerate(cells):
+        width, depth, noise = get_interaction_params(profile, condition)[:3]
+        stats[profile, condition] = cell = RunningStats(len(OUTCOMES))
+        for first in range(0, n_per_cell, chunk_size):
+            n = min(chunk_size, n_per_cell - first)
+            # Each seed block draws its participants' parameters, then its noise
+            parts = [(block_rng(seed, c, start // SEED_BLOCK), min(SEED_BLOCK, n_per_cell - start))
+                     for start in range(first, first + n, SEED_BLOCK)]
+            params = [np.concatenate(p) for p in zip(*(sample_participants(width, depth, noise, size, rng, jitter)
+                                                      for rng, size in parts))]
+            traj = simulate_1d(*params, steps, x0=X0, n_paths=n, rng=_BlockNoise(parts), out=buffer[:, :n])
+            cell.update(participant_outcomes(traj))
+            done += n
+            if progress is not None:
+                progress(done, total)
+    return stats
+
+
+def cohens_d(a, b):
+    """Cohen's d of ``a`` vs ``b`` (pooled SD) per outcome, with its approximate standard error."""
+    pooled = np.sqrt(((a.count - 1) * a.var + (b.count - 1) * b.var) / (a.count + b.count - 2))
+    d = np.divide(a.mean - b.mean, pooled, out=np.zeros_like(pooled), where=pooled > 0)
+    se = np.sqrt((a.count + b.count) / (a.count * b.count) + d**2 / (2 * (a.count + b.count)))
+    return d, se
+
+
+def required_n(d):
+    """Participants per group for 80% power at two-sided α = 0.05 (normal approximation)."""
+    with np.errstate(divide="ignore"):
+        return np.ceil(2 * ((Z_ALPHA + Z_POWER) / np.abs(d))**2)
+
+
+def effect_sizes(stats, control=CONTROL):
+    """Every environment vs ``control`` within each population: {(profile, condition): (d, se, n80)}."""
+    effects = {}
+    for profile in PROFILES:
+        for condition in CONDITIONS:
+            if condition == control:
+                continue
+            d, se = cohens_d(stats[profile, condition], stats[profile, control])
+            effects[profile, condition] = d, se, required_n(d)
+    return effects
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic cohort study of the 3 × 3 PNEI design.")
+    parser.add_argument("--participants", type=int, default=100_000, help="total virtual participants (split over the 9 cells)")
+    parser.add_argument("--steps", type=int, default=1000, help="simulation steps per participant")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help=f"participants simulated at once, rounded to multiples of {SEED_BLOCK} (bounds memory)")
+    parser.add_argument("--jitter", type=float, default=JITTER, help="log-normal sigma of the parameter jitter")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    n_cells = len(PROFILES) * len(CONDITIONS)
+    if args.participants < 2 * n_cells:
+        parser.error(f"--participants must be at least {2 * n_cells} (two per design cell, for the group SDs)")
+    if args.chunk < 1 or args.steps < 1:
+        parser.error("--chunk and --steps must be positive")
+    n_per_cell = args.participants // n_cells
+    chunk = min(max(1, args.chunk // SEED_BLOCK) * SEED_BLOCK, n_per_cell)
+    buffer_mb = args.steps * chunk * np.dtype(DISPLAY_DTYPE).itemsize / 2**20
+
+    print("=" * 60)
+    print("PNEI Waddington Simulator - Synthetic Cohort Study")
+    print("=" * 60)
+    print(f"\n{n_per_cell:,} participants per cell × 9 cells, {args.steps} steps, "
+          f"chunks of {chunk:,} ({buffer_mb:.0f} MB buffer)\n")
+
+    start = time.perf_counter()
+    stats = run_study(n_per_cell, args.steps, args.chunk, args.jitter, args.seed,
+                      progress=lambda done, total: print(f"\r  {done:,}/{total:,} participants", end="", flush=True))
+    elapsed = time.perf_counter() - start
+    print(f"\n  done in {elapsed:.1f} s ({n_per_cell * 9 / elapsed:,.0f} participants/s)\n")
+
+    print("Group means (SD)")
+    print("-" * 60)
+    print(f"{'Population':<24}{'Environment':<22}" + "".join(f"{o:>18}" for o in OUTCOMES))
+    for (profile, condition), cell in stats.items():
+        cols = "".join(f"{m:>10.3f} ({s:.3f})" for m, s in zip(cell.mean, np.sqrt(cell.var)))
+        print(f"{profile:<24}{condition:<22}{cols}")
+
+    effects = effect_sizes(stats)
+    print(f"\nEffect sizes vs {CONTROL}: Cohen's d [95% CI], n per group for 80% power")
+    print("-" * 60)
+    for (profile, condition), (d, se, n80) in effects.items():
+        print(f"{profile:<24}{condition}")
+        for outcome, d_i, se_i, n_i in zip(OUTCOMES, d, se, n80):
+            n_text = f"{n_i:,.0f}" if np.isfinite(n_i) else "∞"
+            print(f"    {outcome:<18} d = {d_i:+.3f} [{d_i - 1.96 * se_i:+.3f}, {d_i + 1.96 * se_i:+.3f}]  n80 = {n_text}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "participants_per_cell": n_per_cell,
+                "steps": args.steps,
+                "jitter": args.jitter,
+                "seed": args.seed,
+                "outcomes": OUTCOMES,
+                "cells": [{"population": p, "environment": c, "n": s.count,
+                           "mean": s.mean.tolist(), "sd": np.sqrt(s.var).tolist()}
+                          for (p, c), s in stats.items()],
+                "effects": [{"population": p, "environment": c, "control": CONTROL,
+                             "d": d.tolist(), "se": se.tolist(),
+                             "n80": [None if not np.isfinite(n) else int(n) for n in n80]}
+                            for (p, c), (d, se, n80) in effects.items()],
+            }, f, indent=2)
+        print(f"\n✓ Wrote {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Ensemble density summaries for the PNEI Waddington simulators.
+
+A single line is the wrong view of a 10,000-path ensemble: it is unreadable
+and its payload grows with the number of paths. The functions below reduce
+an ensemble produced by ``pnei_engine`` to fixed-size grids (quantile bands,
+time x position histogram, 2D occupancy), streaming over blocks of time steps
+so the temporaries stay bounded regardless of ensemble size.
+
+Binning is uniform, so bin indices are computed arithmetically and
+accumulated with ``np.bincount`` (same result as ``np.histogram2d`` with
+uniform edges, without the per-point ``searchsorted``).
+"""
+import numpy as np
+
+BLOCK_STEPS = 64
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def _bin_index(values, lo, hi, bins):
+    """Uniform bin index of ``values`` in [lo, hi]; -1 for out-of-range values."""
+    values = np.asarray(values, dtype=np.float64)
+    idx = np.floor((values - lo) * (bins / (hi - lo))).astype(np.intp)
+    idx[values == hi] = bins - 1  # right edge is inclusive, as in np.histogram
+    idx[(idx < 0) | (idx >= bins)] = -1
+    return idx
+
+
+def quantile_bands(ens, quantiles=QUANTILES, block_steps=BLOCK_STEPS):
+    """
+    Per-step quantiles across paths of a (steps, n_paths) ensemble.
+
+    Returns an array of shape (len(quantiles), steps), computed in float64.
+    """
+    steps = ens.shape[0]
+    bands = np.empty((len(quantiles), steps))
+    for start in range(0, steps, block_steps):
+        block = np.asarray(ens[start:start + block_steps], dtype=np.float64)
+        bands[:, start:start + len(block)] = np.quantile(block, quantiles, axis=1)
+    return bands
+
+
+def time_position_histogram(ens, pos_range=(-4.0, 4.0), pos_bins=80,
+                            time_bins=200, block_steps=BLOCK_STEPS):
+    """
+    Occupancy of a (steps, n_paths) ensemble over time and position.
+
+    Returns ``(density, t_centers, x_centers)`` where ``density`` has shape
+    (pos_bins, time_bins) and each column holds the fraction of path-samples
+    falling in each position bin during that time bin. Samples outside
+    ``pos_range`` are not counted, so a column sums to the fraction inside.
+    """
+    steps, n_paths = ens.shape
+    time_bins = min(time_bins, steps)
+    lo, hi = pos_range
+
+    # Time bin of every step, and how many steps fall into each time bin
+    step_bin = np.arange(steps) * time_bins // steps
+    steps_per_bin = np.bincount(step_bin, minlength=time_bins)
+
+    counts = np.zeros(time_bins * pos_bins, dtype=np.int64)
+    for start in range(0, steps, block_steps):
+        block = ens[start:start + block_steps]
+        pos_idx = _bin_index(block, lo, hi, pos_bins)
+        flat = step_bin[start:start + len(block), None] * pos_bins + pos_idx
+        counts += np.bincount(flat[pos_idx >= 0], minlength=time_bins * pos_bins)
+
+    density = counts.reshape(time_bins, pos_bins) / (steps_per_bin[:, None] * n_paths)
+    t_edges = np.searchsorted(step_bin, np.arange(time_bins + 1))
+    x_edges = np.linspace(lo, hi, pos_bins + 1)
+    return density.T, (t_edges[:-1] + t_edges[1:] - 1) / 2, (x_edges[:-1] + x_edges[1:]) / 2
+
+
+def occupancy_2d(traj, extent=4.0, bins=60, burn_in=0, block_steps=BLOCK_STEPS):
+    """
+    Fraction of time spent in each cell of the landscape.
+
+    ``traj`` is a 2D trajectory from ``simulate_2d``, either (steps + 1, 2) or
+    (steps + 1, n_paths, 2). The first ``burn_in`` rows are skipped. Returns
+    ``(occupancy, centers)`` with ``occupancy`` of shape (bins, bins), indexed
+    [y, x] like ``np.meshgrid`` output, summing to the fraction of samples
+    inside the [-extent, extent] square.
+    """
+    rows = traj.shape[0] - burn_in
+    counts = np.zeros(bins * bins, dtype=np.int64)
+    for start in range(burn_in, traj.shape[0], block_steps):
+        block = traj[start:start + block_steps]
+        ix = _bin_index(block[..., 0], -extent, extent, bins)
+        iy = _bin_index(block[..., 1], -extent, extent, bins)
+        inside = (ix >= 0) & (iy >= 0)
+        counts += np.bincount((iy * bins + ix)[inside], minlength=bins * bins)
+
+    samples = rows * int(np.prod(traj.shape[1:-1], dtype=np.int64))
+    edges = np.linspace(-extent, extent, bins + 1)
+    return counts.reshape(bins, bins) / samples, (edges[:-1] + edges[1:]) / 2
@@ -0,0 +1,104 @@
+"""
+Experimental design of the PNEI study: 3 Populations × 3 Environments.
+
+``get_interaction_params`` maps every cell of the design matrix to Waddington
+parameters and the predicted multi-modal physiological responses. It is
+shared by PNEI_Waddington_Simulator.py (one cell at a time) and the cohort
+generator ``pnei_cohort.py`` (all cells, thousands of participants each).
+"""
+
+PROFILES = ["Neurotypical (NT)", "ASD-like (Rigid)", "ADHD-like (Dispersed)"]
+CONDITIONS = ["G3: Book (Control)", "G1: Human Tutor", "G4: LLM (Active)"]
+CONTROL = CONDITIONS[0]
+
+
+# --- COMPREHENSIVE PNEI OPERATIONALISATION MAP ---
+def get_interaction_params(profile, condition):
+    """
+    Maps experimental design (Population × Environment) to Waddington parameters 
+    and predicts multi-modal physiological responses.
+    
+    Returns: width, depth, noise, hypothesis_text, comprehensive_sensor_predictions
+    
+    PHILOSOPHY: Clinical groups (ASD, ADHD) are not pathological categories, 
+    but accessible topological states that anyone can reach under specific conditions.
+    """
+    
+    # 1. BASELINE DEFINITIONS (Transitory States, Not Fixed Categories)
+    if profile == "Neurotypical (NT)":
+        w, d, n = 1.5, 1.5, 0.4
+    elif profile == "ASD-like (Rigid)":
+        w, d, n = 0.6, 4.0, 0.3
+    elif profile == "ADHD-like (Dispersed)":
+        w, d, n = 3.0, 0.5, 0.6
+
+    # 2. INTERACTION EFFECTS (The Experiment)
+    
+    if condition == "G3: Book (Control)":
+        return w, d, n, "Baseline Control", {
+            "fNIRS (Amygdala)": "Low (Blue)",
+            "fNIRS (rTPJ - Social)": "Low (Baseline)",
+            "fNIRS (DLPFC - Logic)": "Moderate (Green)",
+            "HRV (Vagal Tone)": "Stable",
+            "GSR (Stress)": "Low"
+        }
+
+    elif condition == "G1: Human Tutor":
+        if profile == "Neurotypical (NT)":
+            # Scaffolding: High DLPFC efficiency, Moderate Social
+            return w, d * 1.5, n * 0.5, "Social Scaffolding", {
+                "fNIRS (Amygdala)": "Moderate (Social Engagement)",
+                "fNIRS (rTPJ - Social)": "Moderate (Theory of Mind Active)",
+                "fNIRS (DLPFC - Logic)": "High (Boosted by Scaffolding)",
+                "HRV (Vagal Tone)": "High (Co-regulation)",
+                "GSR (Stress)": "Optimal Arousal"
+            }
+        elif profile == "ASD-like (Rigid)":
+            # Social Friction: Massive rTPJ load acts as Noise
+            return w, d, n + 1.5, "Social Friction (High Cost)", {
+                "fNIRS (Amygdala)": "🚨 HIGH ALERT (Red - Limbic Activation)",
+                "fNIRS (rTPJ - Social)": "🚨 SPIKE (Social Processing Overload)",
+                "fNIRS (DLPFC - Logic)": "Low (Resource Steal Effect)",
+                "HRV (Vagal Tone)": "📉 Collapsing (Vagal Withdrawal)",
+                "GSR (Stress)": "📈 Spiking (Sympathetic Dominance)"
+            }
+        elif profile == "ADHD-like (Dispersed)":
+            # External Regulation: Human supports DLPFC
+            return w, d * 3.0, n, "External Regulation", {
+                "fNIRS (Amygdala)": "Low (Reduced Anxiety)",
+                "fNIRS (rTPJ - Social)": "Moderate (Social Anchor)",
+                "fNIRS (DLPFC - Logic)": "✅ Supported (External Pacing)",
+                "HRV (Vagal Tone)": "Increased (External Co-regulation)",
+                "GSR (Stress)": "Moderate (Managed)"
+            }
+
+    elif condition == "G4: LLM (Active)":
+        if profile == "Neurotypical (NT)":
+            # Logical Depuration: Low Social, High Logic
+            return w, d * 0.8, n + 0.2, "Logical Depuration", {
+                "fNIRS (Amygdala)": "Low (No Social Cues)",
+                "fNIRS (rTPJ - Social)": "📉 Low (Social Depuration)",
+                "fNIRS (DLPFC - Logic)": "High (Utilitarian Processing)",
+                "HRV (Vagal Tone)": "Baseline",
+                "GSR (Stress)": "Low"
+            }
+        elif profile == "ASD-like (Rigid)":
+            # Social Bypass: rTPJ stays quiet, DLPFC works well
+            return w, d, n, "✅ Social Bypass (Low Cost)", {
+                "fNIRS (Amygdala)": "✅ Low/Baseline (No Social Friction)",
+                "fNIRS (rTPJ - Social)": "✅ Low (Energy Conservation)",
+                "fNIRS (DLPFC - Logic)": "📈 High (Resources Freed for Task)",
+                "HRV (Vagal Tone)": "Stable (Safety Signal)",
+                "GSR (Stress)": "Low"
+            }
+        elif profile == "ADHD-like (Dispersed)":
+            # Burnout: High DLPFC demand without support -> Fatigue
+            return w, d, n + 1.0, "⚠️ Executive Burnout (Constructivist Overload)", {
+                "fNIRS (Amygdala)": "Rising (Frustration/Anxiety)",
+                "fNIRS (rTPJ - Social)": "Phantom Activation (Seeking Support)",
+                "fNIRS (DLPFC - Logic)": "📉 Fading (Metabolic Fatigue)",
+                "HRV (Vagal Tone)": "📉 Dropping Fast (Exhaustion)",
+                "GSR (Stress)": "High (Sustained Effort)"
+            }
+            
+    return w, d, n, "Undef", {}
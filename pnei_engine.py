@@ -0,0 +1,161 @@
+"""
+Langevin integration engine shared by the PNEI Waddington simulators.
+
+All simulators integrate the overdamped Langevin equation
+
+    dx = -grad U(x) dt + noise * sqrt(dt) * N(0, 1)
+
+with the Euler-Maruyama scheme. This module writes trajectories directly
+into preallocated arrays (no Python lists, no intermediate DataFrames) and
+supports ensembles of independent paths integrated in lock-step.
+
+Storage dtype is selectable: the integration state is always float64, only
+the stored samples are cast, so float32 halves memory for display and large
+ensembles while float64 keeps full precision for analysis.
+
+Noise is drawn from a legacy ``RandomState`` in row-major order, in blocks of
+``BLOCK_STEPS`` steps, so a single path seeded with 42 reproduces exactly the
+sequence of the original ``np.random.seed(42)`` / ``np.random.normal()`` loops.
+
+Both integrators accept a ``progress`` callback, called as
+``progress(done_steps, steps)`` after every block; background workers use it
+to report progress and to abort a superseded run by raising from it.
+"""
+import numpy as np
+
+DT = 0.05
+SEED = 42
+BLOCK_STEPS = 256
+
+# Storage dtypes: float32 for display / large ensembles, float64 for analysis
+DISPLAY_DTYPE = np.float32
+ANALYSIS_DTYPE = np.float64
+
+
+# --- LANDSCAPES ---
+
+def potential_1d(val, w, d):
+    """Gaussian valley with quartic walls (PNEI_Waddington_Simulator.py / 3.py)."""
+    return -d * np.exp(-(val**2) / (2 * w**2)) + 0.02 * val**4
+
+
+def drift_1d(pos, width, depth):
+    """Deterministic force -dU/dx of the 1D landscape."""
+    return -(pos * (depth / width**2)) * np.exp(-(pos**2) / (2 * width**2)) - 0.08 * pos**3
+
+
+def potential_2d(x, y, width, depth, wall):
+    """Radial Gaussian valley plus quartic walls of strength ``wall``."""
+    return -depth * np.exp(-(x**2 + y**2) / (2 * width**2)) + wall * (x**4 + y**4)
+
+
+def drift_2d(x, y, width, depth):
+    """
+    Restoring force of the 2D valley.
+
+    As in PNEI_Waddington_Simulator1.py / 2.py the quartic walls only shape the
+    rendered surface and do not enter the force.
+    """
+    exp_factor = np.exp(-(x**2 + y**2) / (2 * width**2))
+    return -(x * depth / width**2) * exp_factor, -(y * depth / width**2) * exp_factor
+
+
+# --- INTEGRATORS ---
+
+def _allocate(out, shape, dtype):
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if out.shape != shape:
+        raise ValueError(f"out has shape {out.shape}, expected {shape}")
+    return out
+
+
+def simulate_1d(width, depth, noise, steps, x0=1.5, n_paths=None, dt=DT,
+                seed=SEED, rng=None, dtype=ANALYSIS_DTYPE, out=None, progress=None):
+    """
+    Integrate the 1D landscape.
+
+    Returns an array of shape (steps,) for a single path, or (steps, n_paths)
+    for an ensemble; row t holds the positions after step t+1. ``width``,
+    ``depth``, ``noise`` and ``x0`` may be scalars or arrays broadcastable to
+    (n_paths,), which lets one call sweep a whole parameter sample.
+    """
+    rng = np.random.RandomState(seed) if rng is None else rng
+    path_shape = () if n_paths is None else (n_paths,)
+    traj = _allocate(out, (steps,) + path_shape, dtype)
+
+    pos = np.array(np.broadcast_to(x0, path_shape), dtype=np.float64)
+    kick = noise * np.sqrt(dt)
+
+    for start in range(0, steps, BLOCK_STEPS):
+        block = min(BLOCK_STEPS, steps - start)
+        xi = rng.standard_normal((block,) + path_shape)
+        for i in range(block):
+            pos = pos + (drift_1d(pos, width, depth) * dt + kick * xi[i])
+            traj[start + i] = pos
+        if progress is not None:
+            progress(start + block, steps)
+    return traj
+
+
+def simulate_2d(width, depth, noise, steps, start=(2.5, 2.5), n_paths=None,
+                dt=DT, seed=SEED, rng=None, dtype=ANALYSIS_DTYPE, out=None, progress=None):
+    """
+    Integrate the 2D landscape.
+
+    Returns an array of shape (steps + 1, 2) for a single path, or
+    (steps + 1, n_paths, 2) for an ensemble; row 0 is the starting point and
+    the last axis holds (x, y). Parameters broadcast as in ``simulate_1d``.
+    """
+    rng = np.random.RandomState(seed) if rng is None else rng
+    path_shape = () if n_paths is None else (n_paths,)
+    traj = _allocate(out, (steps + 1,) + path_shape + (2,), dtype)
+
+    pos = np.array(np.broadcast_to(start, path_shape + (2,)), dtype=np.float64)
+    x, y = pos[..., 0], pos[..., 1]
+    traj[0] = pos
+    kick = noise * np.sqrt(dt)
+
+    for first in range(0, steps, BLOCK_STEPS):
+        block = min(BLOCK_STEPS, steps - first)
+        xi = rng.standard_normal((block,) + path_shape + (2,))
+        for i in range(block):
+            force_x, force_y = drift_2d(x, y, width, depth)
+            x = x + (force_x * dt + kick * xi[i, ..., 0])
+            y = y + (force_y * dt + kick * xi[i, ..., 1])
+            row = traj[first + i + 1]
+            row[..., 0] = x
+            row[..., 1] = y
+        if progress is not None:
+            progress(first + block, steps)
+    return traj
+
+
+class ExtendablePath1D:
+    """
+    A seeded single 1D path that grows on demand.
+
+    ``get(steps)`` integrates only the steps not computed yet, continuing from
+    the last position with the same ``RandomState``, so extending a run gives
+    exactly the path a longer run would have produced; shorter requests are
+    prefix views of the stored buffer. Storage is float64, so the continued
+    state is exact.
+    """
+
+    def __init__(self, width, depth, noise, x0=1.5, dt=DT, seed=SEED):
+        self.params = (width, depth, noise)
+        self.x0 = x0
+        self.dt = dt
+        self._rng = np.random.RandomState(seed)
+        self._traj = np.empty(0, dtype=ANALYSIS_DTYPE)
+
+    def get(self, steps):
+        """Positions after steps 1..``steps``, shape (steps,)."""
+        done = len(self._traj)
+        if steps > done:
+            traj = np.empty(steps, dtype=ANALYSIS_DTYPE)
+            traj[:done] = self._traj
+            simulate_1d(*self.params, steps - done, x0=self._traj[-1] if done else self.x0,
+                        dt=self.dt, rng=self._rng, out=traj[done:])
+            self._traj = traj
+        return self._traj[:steps]
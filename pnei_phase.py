@@ -0,0 +1,212 @@
+"""
+Phase portrait of the 2D PNEI landscapes (PNEI_Waddington_Simulator1.py / 2.py).
+
+The rendered surface is ``U = -depth * exp(-r^2 / 2 width^2) + wall (x^4 + y^4)``
+but, as in the simulators, the dynamics are driven only by the valley: the
+quartic walls shape the surface and do not enter the force (``drift_2d``).
+Far from the valley the drift vanishes, so a state that starts there barely
+moves within the observation time. With ``wall > 0`` the field is instead the
+full ``-grad U`` of the rendered surface (confining walls), for comparison.
+
+Everything is evaluated on whole grids at once:
+- ``drift_field``: vector field on the landscape grid;
+- ``fixed_points``: Newton iterations from a grid of seeds, all seeds updated
+  together with the analytic Jacobian, then deduplicated and classified
+  (stable / unstable / saddle) from the Jacobian's trace and determinant;
+- ``basins``: every grid cell follows the deterministic flow for the
+  observation time and is labelled with the stable point it reaches (or -1
+  if it is not captured); the apps draw the basin boundaries as a contour
+  of the labels.
+
+``add_overlay`` and ``basin_caption`` draw the portrait on the occupancy map
+of Simulator1 and Simulator2 (plotly is imported only when drawing).
+"""
+import numpy as np
+
+from pnei_engine import DT, drift_2d
+
+EXTENT = 4.0
+QUIVER_SIZE = 21
+BASIN_SIZE = 80
+NEWTON_SEEDS = 15
+NEWTON_ITERATIONS = 50
+HORIZON_STEPS = 1000  # longest observation time of the simulators' sliders
+CAPTURE_RADIUS = 0.1
+CHECK_EVERY = 50
+
+KINDS = ("stabile", "instabile", "sella")
+
+
+def drift_field(x, y, width, depth, wall=0.0):
+    """Deterministic drift (fx, fy); ``wall > 0`` adds the force of the quartic walls."""
+    fx, fy = drift_2d(x, y, width, depth)
+    if wall:
+        fx = fx - 4 * wall * x**3
+        fy = fy - 4 * wall * y**3
+    return fx, fy
+
+
+def jacobian(x, y, width, depth, wall=0.0):
+    """Analytic Jacobian of ``drift_field``, shape x.shape + (2, 2)."""
+    a = depth / width**2
+    e = np.exp(-(x**2 + y**2) / (2 * width**2))
+    cross = a * x * y * e / width**2
+    J = np.empty(np.shape(x) + (2, 2))
+    J[..., 0, 0] = -a * e * (1 - x**2 / width**2) - 12 * wall * x**2
+    J[..., 0, 1] = cross
+    J[..., 1, 0] = cross
+    J[..., 1, 1] = -a * e * (1 - y**2 / width**2) - 12 * wall * y**2
+    return J
+
+
+def classify(J):
+    """Kind index (see ``KINDS``) of fixed points from their Jacobians."""
+    det = J[..., 0, 0] * J[..., 1, 1] - J[..., 0, 1] * J[..., 1, 0]
+    trace = J[..., 0, 0] + J[..., 1, 1]
+    return np.where(det < 0, 2, np.where(trace < 0, 0, 1))
+
+
+def fixed_points(width, depth, wall=0.0, extent=EXTENT, seeds=NEWTON_SEEDS,
+                 iterations=NEWTON_ITERATIONS, tol=1e-10):
+    """
+    Zeros of the drift inside [-extent, extent]^2 by vectorized Newton.
+
+    Returns ``(points, kinds)``: an (m, 2) array and the kind index of each.
+    Seeds whose iteration leaves the domain or hits a singular Jacobian are
+    dropped, which also discards the flat region far from the valley where
+    the drift is numerically zero but not a true equilibrium.
+    """
+    axis = np.linspace(-extent, extent, seeds)
+    x, y = (g.ravel() for g in np.meshgrid(axis, axis))
+    alive = np.ones(x.shape, dtype=bool)
+    x0, y0 = x, y
+
+    for _ in range(iterations):
+        fx, fy = drift_field(x, y, width, depth, wall)
+        J = jacobian(x, y, width, depth, wall)
+        det = J[..., 0, 0] * J[..., 1, 1] - J[..., 0, 1] * J[..., 1, 0]
+        alive &= np.abs(det) > 1e-12
+        det = np.where(alive, det, 1.0)
+        # Newton step -J^-1 F with the explicit 2x2 inverse; dropped seeds stay put
+        x = np.where(alive, x - (J[..., 1, 1] * fx - J[..., 0, 1] * fy) / det, x)
+        y = np.where(alive, y - (J[..., 0, 0] * fy - J[..., 1, 0] * fx) / det, y)
+        alive &= (np.abs(x) <= extent) & (np.abs(y) <= extent)
+        x, y = np.where(alive, x, x0), np.where(alive, y, y0)
+
+    fx, fy = drift_field(x, y, width, depth, wall)
+    alive &= np.hypot(fx, fy) < tol
+    points = np.unique(np.round(np.column_stack([x[alive], y[alive]]), 6) + 0.0, axis=0)
+    return points, classify(jacobian(points[:, 0], points[:, 1], width, depth, wall))
+
+
+def basins(width, depth, wall=0.0, points=None, kinds=None, extent=EXTENT, bins=BASIN_SIZE,
+           steps=HORIZON_STEPS, dt=DT, capture_radius=CAPTURE_RADIUS):
+    """
+    Basin of attraction of each stable fixed point, within ``steps`` steps.
+
+    Returns ``(labels, centers)``: ``labels[y, x]`` is the index (into
+    ``points``) of the stable point reached from the cell, or -1.
+    """
+    if points is None:
+        points, kinds = fixed_points(width, depth, wall, extent)
+    centers = np.linspace(-extent, extent, bins)
+    x, y = (g.ravel() for g in np.meshgrid(centers, centers))
+    labels = np.full(x.shape, -1)
+    active = np.arange(x.size)
+    stable = np.flatnonzero(kinds == 0)
+
+    # Cells are integrated together; every CHECK_EVERY steps the captured ones are
+    # labelled and dropped, so the remaining work shrinks as the basins fill up
+    for done in range(0, steps, CHECK_EVERY):
+        for _ in range(min(CHECK_EVERY, steps - done)):
+            fx, fy = drift_field(x, y, width, depth, wall)
+            x = x + fx * dt
+            y = y + fy * dt
+        captured = np.zeros(x.shape, dtype=bool)
+        for i in stable:
+            near = np.hypot(x - points[i, 0], y - points[i, 1]) < capture_radius
+            labels[active[near]] = i
+            captured |= near
+        active, x, y = active[~captured], x[~captured], y[~captured]
+        if not active.size:
+            break
+    return labels.reshape(bins, bins), centers
+
+
+def quiver_segments(width, depth, wall=0.0, extent=EXTENT, size=QUIVER_SIZE):
+    """
+    Arrow polylines of the drift on a coarse grid, for one Plotly scatter trace.
+
+    Arrow length grows with the square root of the drift magnitude (so weak
+    and strong regions stay readable) up to one grid spacing. Returns (xs, ys)
+    with NaN separators between arrows.
+    """
+    axis = np.linspace(-extent, extent, size)
+    x, y = (g.ravel() for g in np.meshgrid(axis, axis))
+    fx, fy = drift_field(x, y, width, depth, wall)
+    magnitude = np.hypot(fx, fy)
+    spacing = axis[1] - axis[0]
+    length = 0.9 * spacing * np.sqrt(magnitude / max(magnitude.max(), 1e-12))
+    ux, uy = np.divide(fx, magnitude, out=np.zeros_like(fx), where=magnitude > 0), \
+        np.divide(fy, magnitude, out=np.zeros_like(fy), where=magnitude > 0)
+
+    tip_x, tip_y = x + ux * length, y + uy * length
+    head = 0.35 * length
+    # Arrowhead barbs: the shaft direction rotated by ±150°
+    cos, sin = np.cos(np.radians(150)), np.sin(np.radians(150))
+    left_x, left_y = tip_x + head * (ux * cos - uy * sin), tip_y + head * (ux * sin + uy * cos)
+    right_x, right_y = tip_x + head * (ux * cos + uy * sin), tip_y + head * (-ux * sin + uy * cos)
+
+    nan = np.full_like(x, np.nan)
+    xs = np.column_stack([x, tip_x, left_x, tip_x, right_x, nan]).ravel()
+    ys = np.column_stack([y, tip_y, left_y, tip_y, right_y, nan]).ravel()
+    return xs, ys
+
+
+def phase_portrait(width, depth, wall=0.0, extent=EXTENT):
+    """Everything the overlay needs for one (width, depth, wall), cheap to cache."""
+    points, kinds = fixed_points(width, depth, wall, extent)
+    labels, centers = basins(width, depth, wall, points, kinds, extent)
+    return {
+        "quiver": quiver_segments(width, depth, wall, extent),
+        "points": points,
+        "kinds": kinds,
+        "labels": labels,
+        "centers": centers,
+    }
+
+
+def basin_at(portrait, x, y):
+    """Label of the basin cell containing (x, y)."""
+    centers = portrait["centers"]
+    ix = np.abs(centers - x).argmin()
+    iy = np.abs(centers - y).argmin()
+    return portrait["labels"][iy, ix]
+
+
+def add_overlay(fig, portrait):
+    """Add drift arrows, dashed basin boundaries and fixed-point markers to a Plotly figure."""
+    import plotly.graph_objects as go
+
+    quiver_x, quiver_y = portrait["quiver"]
+    fig.add_trace(go.Scatter(x=quiver_x, y=quiver_y, mode='lines', line=dict(color='rgba(30, 30, 30, 0.55)', width=1), hoverinfo='skip', showlegend=False))
+    fig.add_trace(go.Contour(
+        z=portrait["labels"], x=portrait["centers"], y=portrait["centers"],
+        contours=dict(start=-0.5, end=len(portrait["points"]) - 0.5, size=1, coloring='none'),
+        line=dict(color='deepskyblue', width=2, dash='dash'), showscale=False, hoverinfo='skip', showlegend=False
+    ))
+    fig.add_trace(go.Scatter(
+        x=portrait["points"][:, 0], y=portrait["points"][:, 1], mode='markers',
+        marker=dict(size=12, color='deepskyblue', symbol=[('circle', 'circle-open', 'x')[k] for k in portrait["kinds"]], line=dict(color='white', width=1)),
+        text=[f"Punto fisso {KINDS[k]}" for k in portrait["kinds"]], hoverinfo='text', showlegend=False
+    ))
+
+
+def basin_caption(portrait, start):
+    """Caption of the overlay: is the starting point inside the capture basin?"""
+    where = f"La partenza ({start[0]}, {start[1]})"
+    if basin_at(portrait, *start) >= 0:
+        return (f"Tratteggio: confine del bacino di cattura. {where} è dentro il bacino: senza rumore "
+                f"la valle la riporta all'omeostasi entro {HORIZON_STEPS} passi.")
+    return (f"Tratteggio: confine del bacino di cattura. {where} è fuori dal bacino: lì la forza della "
+            f"valle è quasi nulla e senza rumore lo stato non raggiunge l'omeostasi entro {HORIZON_STEPS} passi.")
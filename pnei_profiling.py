@@ -0,0 +1,195 @@
+"""
+Opt-in instrumentation for the PNEI Waddington simulators.
+
+When a rerun feels slow in a live lecture, ``StageTimer`` tells where the time
+goes: each simulator wraps its stages in ``with timer.stage(name):`` blocks
+
+    grid           landscape evaluation on the plotting grid
+    physics        Langevin integration (single path or ensemble)
+    figures        building the Plotly figures
+    serialization  st.plotly_chart / st.line_chart: figure -> protobuf,
+                   queued for the websocket
+
+and the breakdown is rendered in the sidebar. Optionally the whole run is
+captured with cProfile or pyinstrument (if installed) and dumped to
+``profiles/`` for offline analysis (``python -m pstats``, snakeviz, ...).
+
+Disabled timers only add a no-op context manager per stage. Apps get the
+sidebar controls and the timer from ``profiling_controls`` (labels localized
+through ``LABELS``) and call ``finish`` at the end of the script; the timer
+of an interrupted previous run is stopped first. Profiling is enabled from
+the sidebar or, for every run, with ``PNEI_PROFILE=1`` (cProfile:
+``PNEI_PROFILE=cProfile``, pyinstrument: ``PNEI_PROFILE=pyinstrument``).
+"""
+import cProfile
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+PROFILE_ENV = "PNEI_PROFILE"
+PROFILE_DIR = Path(__file__).resolve().parent / "profiles"
+PROFILERS = ("off", "cProfile", "pyinstrument")
+SESSION_KEY = "stage_timer"
+LABELS = {
+    "en": {"timings": "Time each stage", "dump": "Dump traces to profiles/"},
+    "it": {"timings": "Misura tempi per fase", "dump": "Salva trace in profiles/"},
+}
+
+
+def env_settings():
+    """(enabled, profiler) defaults from the PNEI_PROFILE environment variable."""
+    value = os.environ.get(PROFILE_ENV, "").strip()
+    if not value or value == "0":
+        return False, "off"
+    profiler = next((p for p in PROFILERS[1:] if p.lower() == value.lower()), "off")
+    return True, profiler
+
+
+class StageTimer:
+    """Accumulates wall-clock time per named stage over one script run."""
+
+    def __init__(self, enabled=False, profiler="off"):
+        self.enabled = enabled
+        self.timings = {}
+        self.profiler = profiler if enabled else "off"
+        self.notes = []
+        self._profile = None
+        self._start = time.perf_counter()
+        self.total = None
+        self.panel = None          # container of the breakdown, set by profiling_controls
+        self.dump_traces = False
+        if self.profiler != "off":
+            self._start_profiler()
+
+    def _start_profiler(self):
+        if self.profiler == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                self.notes.append("pyinstrument not installed, using cProfile")
+                self.profiler = "cProfile"
+            else:
+                self._profile = Profiler()
+                self._profile.start()
+                return
+        self._profile = cProfile.Profile()
+        try:
+            self._profile.enable()
+        except ValueError:  # another profiler is already active on this thread
+            self.notes.append("cProfile unavailable (another profiler is active)")
+            self._profile, self.profiler = None, "off"
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block and add it to stage ``name``."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def stop(self):
+        """Stop the profiler (if any) and freeze the total run time."""
+        if self.total is None:
+            self.total = time.perf_counter() - self._start
+            if self.profiler == "pyinstrument":
+                self._profile.stop()
+            elif self._profile is not None:
+                self._profile.disable()
+        return self.total
+
+    def breakdown(self):
+        """Rows of (stage, seconds, share of total), plus the untimed remainder."""
+        total = self.stop()
+        rows = [(name, seconds, seconds / total) for name, seconds in self.timings.items()]
+        other = max(total - sum(self.timings.values()), 0.0)
+        rows.append(("other", other, other / total))
+        return rows
+
+    def dump(self, app, directory=PROFILE_DIR):
+        """Write the stage timings (JSON) and the profile, if captured; return the paths."""
+        total = self.stop()
+        directory.mkdir(exist_ok=True)
+        stem = f"{Path(app).stem}-{datetime.now():%Y%m%d-%H%M%S-%f}"
+
+        timings_path = directory / f"{stem}.json"
+        timings_path.write_text(json.dumps({
+            "app": Path(app).name,
+            "total_s": total,
+            "stages_s": self.timings,
+            "profiler": self.profiler,
+        }, indent=2), encoding="utf-8")
+        paths = [timings_path]
+
+        if self.profiler == "pyinstrument":
+            paths.append(directory / f"{stem}.html")
+            paths[-1].write_text(self._profile.output_html(), encoding="utf-8")
+        elif self._profile is not None:
+            paths.append(directory / f"{stem}.prof")
+            self._profile.dump_stats(paths[-1])
+        return paths
+
+
+def session_timer(state, enabled=False, profiler="off"):
+    """
+    ``StageTimer`` for the current run, kept in ``state`` (``st.session_state``).
+
+    The timer of the previous run is stopped first: a run that Streamlit
+    interrupts (a slider moved mid-script) never reaches ``finish``, and
+    its profiler would otherwise stay enabled and block the next one.
+    """
+    previous = state.get(SESSION_KEY)
+    if previous is not None:
+        previous.stop()
+    timer = state[SESSION_KEY] = StageTimer(enabled, profiler)
+    return timer
+
+
+def profiling_controls(container, state, labels=LABELS["en"]):
+    """
+    The "⏱️ Profiling" expander in ``container`` (``st.sidebar``) and the timer of this run.
+
+    ``labels`` is an entry of ``LABELS``. The expander keeps an empty slot
+    where ``finish`` renders the breakdown at the end of the script.
+    """
+    box = container.expander("⏱️ Profiling")
+    enabled, default = env_settings()
+    profiling = box.checkbox(labels["timings"], value=enabled)
+    profiler = box.selectbox("Profiler", PROFILERS, index=PROFILERS.index(default), disabled=not profiling)
+    dump_traces = box.checkbox(labels["dump"], disabled=not profiling)
+    timer = session_timer(state, profiling, profiler)
+    timer.panel, timer.dump_traces = box.empty(), dump_traces
+    return timer
+
+
+def finish(timer, app, recomputed=None):
+    """Render the breakdown of a ``profiling_controls`` timer and dump the traces if asked."""
+    if timer.enabled:
+        render_panel(timer.panel, timer, timer.dump(app) if timer.dump_traces else (), recomputed)
+
+
+def render_panel(container, timer, dumped=(), recomputed=None):
+    """
+    Render the timing breakdown of ``timer`` into a Streamlit container.
+
+    ``recomputed``, if given, lists the ``RecomputeGraph`` stages actually
+    recomputed during the run (the others were served from the graph).
+    """
+    lines = ["| Stage | ms | % |", "|---|---:|---:|"]
+    for name, seconds, share in timer.breakdown():
+        lines.append(f"| {name} | {seconds * 1000:.1f} | {share:.0%} |")
+    lines.append(f"| **total** | **{timer.total * 1000:.1f}** | |")
+    if recomputed is not None:
+        names = ", ".join(f"`{name}`" for name in recomputed) or "none (all cached)"
+        lines.append(f"\nRecomputed: {names}")
+    if timer.profiler != "off":
+        lines.append(f"\nProfiler: `{timer.profiler}`")
+    lines += [f"\n⚠️ {note}" for note in timer.notes]
+    lines += [f"\n💾 `profiles/{path.name}`" for path in dumped]
+    container.markdown("\n".join(lines))
@@ -0,0 +1,38 @@
+"""
+Dependency-tracking recompute for the PNEI Waddington simulators.
+
+Streamlit reruns the whole script on every interaction. A ``RecomputeGraph``
+kept in ``st.session_state`` memoizes each stage of the script under the
+inputs it depends on, so a rerun only recomputes the stages whose inputs
+changed, e.g. in PNEI_Waddington_Simulator3.py:
+
+    landscape   <- (width, depth)
+    trajectory  <- (width, depth, noise)        extended to the duration
+    metrics     <- (width, depth, noise, duration)
+
+Unlike ``st.cache_data`` the values are neither hashed nor copied on every
+hit, and each session keeps exactly one value per stage.
+"""
+
+
+class RecomputeGraph:
+    """Per-session memo of named stages, each keyed by a tuple of its inputs."""
+
+    def __init__(self):
+        self._nodes = {}
+        self.recomputed = []
+
+    def node(self, name, inputs, compute):
+        """Value of stage ``name``: cached if ``inputs`` are unchanged, else ``compute()``."""
+        cached = self._nodes.get(name)
+        if cached is not None and cached[0] == inputs:
+            return cached[1]
+        value = compute()
+        self._nodes[name] = (inputs, value)
+        self.recomputed.append(name)
+        return value
+
+    def start_run(self):
+        """Reset the list of stages recomputed during the current script run."""
+        self.recomputed = []
+        return self
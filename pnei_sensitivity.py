@@ -0,0 +1,186 @@
+"""
+Global sensitivity of the allostatic verdicts to width, depth and noise.
+
+The verdicts of PNEI_Waddington_Simulator1.py ("Sistema in Omeostasi",
+"Carico Allostatico Elevato", ...) are thresholds on the mean dispersion,
+the mean radial distance ``sqrt(x² + y²)`` from equilibrium after a burn-in.
+This module measures how much each parameter drives that metric in a
+neighbourhood of a preset:
+
+- **Sobol indices** (Saltelli design): first-order ``S1`` (share of the
+  metric variance explained by the parameter alone) and total ``ST`` (alone
+  or in interaction), with the Saltelli (2010) / Jansen estimators;
+- **Morris elementary effects**: ``mu_star`` (mean absolute effect of a
+  step of Δ in the unit-scaled parameter) and ``sigma`` (non-linearity /
+  interactions);
+- **verdict stability**: share of the neighbourhood that keeps the verdict
+  of the preset itself.
+
+Samples come from a Halton sequence (quasi-random, numpy only). Every sample
+point of every preset is one path of a single ``simulate_2d`` ensemble call,
+with the parameters passed as per-path arrays, so all presets are evaluated
+in one vectorized pass. All paths share the same noise realization (common
+random numbers, seed 42): the metric is then a deterministic function of the
+parameters, exactly the one behind the verdict shown in the app.
+"""
+import numpy as np
+
+from pnei_engine import SEED, simulate_2d
+
+PARAMS = ("width", "depth", "noise")
+PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29)
+
+# PNEI_Waddington_Simulator1.py: slider ranges, starting point, metric and verdicts
+BOUNDS = {"width": (0.5, 4.0), "depth": (0.1, 5.0), "noise": (0.0, 2.0)}
+START = (2.5, 2.5)
+BURN_IN = 100
+THRESHOLDS = (1.0, 2.0)
+VERDICTS = ("Sistema in Omeostasi", "Carico Allostatico Elevato", "Sistema fuori equilibrio")
+
+SPREAD = 0.5        # neighbourhood: each parameter within ±50% of the preset
+N_SOBOL = 256       # Saltelli base sample size, N (k + 2) evaluations
+N_MORRIS = 32       # Morris trajectories, r (k + 1) evaluations
+MORRIS_DELTA = 2 / 3
+
+
+def halton(n, dims, skip=1):
+    """First ``n`` points (after ``skip``) of the ``dims``-dimensional Halton sequence in [0, 1)."""
+    index = np.arange(skip, skip + n)
+    points = np.empty((n, dims))
+    for d, base in enumerate(PRIMES[:dims]):
+        i, f = index.copy(), 1.0
+        points[:, d] = 0.0
+        while np.any(i > 0):
+            f /= base
+            points[:, d] += f * (i % base)
+            i //= base
+    return points
+
+
+def neighbourhood(width, depth, noise, spread=SPREAD, bounds=BOUNDS):
+    """(lo, hi) arrays of the parameter box around a preset, clipped to the slider ranges."""
+    center = np.array([width, depth, noise], dtype=np.float64)
+    lo = np.array([bounds[p][0] for p in PARAMS])
+    hi = np.array([bounds[p][1] for p in PARAMS])
+    return np.clip(center * (1 - spread), lo, hi), np.clip(center * (1 + spread), lo, hi)
+
+
+def saltelli_design(n=N_SOBOL):
+    """Unit-cube Saltelli matrices A, B and AB (A with column i from B), stacked: (n (k + 2), k)."""
+    k = len(PARAMS)
+    base = halton(n, 2 * k)
+    A, B = base[:, :k], base[:, k:]
+    AB = np.repeat(A[None], k, axis=0)
+    for i in range(k):
+        AB[i, :, i] = B[:, i]
+    return np.concatenate([A, B, AB.reshape(-1, k)])
+
+
+def morris_design(r=N_MORRIS, delta=MORRIS_DELTA, seed=SEED):
+    """
+    Unit-cube Morris trajectories, stacked: (r (k + 1), k).
+
+    Each trajectory starts at a quasi-random point of [0, 1 - delta]^k and
+    moves one parameter at a time by +delta, in a random order.
+    """
+    k = len(PARAMS)
+    rng = np.random.RandomState(seed)
+    starts = halton(r, k) * (1 - delta)
+    design = np.empty((r, k + 1, k))
+    design[:, 0] = starts
+    orders = np.array([rng.permutation(k) for _ in range(r)])
+    for step in range(k):
+        design[:, step + 1] = design[:, step]
+        design[np.arange(r), step + 1, orders[:, step]] += delta
+    return design.reshape(-1, k), orders
+
+
+class _CommonNoise:
+    """``RandomState`` facade handing every path the same draws (common random numbers)."""
+
+    def __init__(self, seed):
+        self._rng = np.random.RandomState(seed)
+
+    def standard_normal(self, shape):
+        block, _, dims = shape
+        return np.broadcast_to(self._rng.standard_normal((block, dims))[:, None, :], shape)
+
+
+def allostatic_metric(width, depth, noise, steps, start=START, burn_in=BURN_IN, seed=SEED, progress=None):
+    """
+    Mean dispersion after ``burn_in`` for per-path parameter arrays, shape (n,).
+
+    With scalar parameters of a single point this is exactly the "Dispersione
+    Media" of PNEI_Waddington_Simulator1.py.
+    """
+    width, depth, noise = np.broadcast_arrays(*(np.asarray(p, dtype=np.float64) for p in (width, depth, noise)))
+    traj = simulate_2d(width, depth, noise, steps, start=start, n_paths=width.size,
+                       rng=_CommonNoise(seed), progress=progress)
+    return np.sqrt(traj[burn_in:, :, 0]**2 + traj[burn_in:, :, 1]**2).mean(axis=0)
+
+
+def verdict_index(metric, thresholds=THRESHOLDS):
+    """0, 1, 2 for omeostasi, carico elevato, fuori equilibrio (strict ``>`` thresholds, as in the app)."""
+    return np.searchsorted(thresholds, metric, side="left")
+
+
+def sobol_indices(f, n):
+    """First-order (Saltelli 2010) and total (Jansen) indices from stacked A, B, AB outputs."""
+    k = len(PARAMS)
+    f_A, f_B, f_AB = f[:n], f[n:2 * n], f[2 * n:].reshape(k, n)
+    var = np.var(np.concatenate([f_A, f_B]))
+    if var == 0:
+        return np.zeros(k), np.zeros(k)
+    S1 = np.mean(f_B * (f_AB - f_A), axis=1) / var
+    ST = 0.5 * np.mean((f_A - f_AB)**2, axis=1) / var
+    return S1, ST
+
+
+def morris_indices(f, orders, r, delta=MORRIS_DELTA):
+    """Morris ``mu_star`` and ``sigma`` per parameter, on the unit-scaled parameters."""
+    k = len(PARAMS)
+    f = f.reshape(r, k + 1)
+    effects = np.empty((r, k))
+    effects[np.arange(r)[:, None], orders] = np.diff(f, axis=1) / delta
+    return np.abs(effects).mean(axis=0), effects.std(axis=0, ddof=1)
+
+
+def analyze(presets, steps, n_sobol=N_SOBOL, n_morris=N_MORRIS, spread=SPREAD, progress=None):
+    """
+    Sensitivity of the allostatic metric around each preset, in one pass.
+
+    ``presets`` maps a name to ``(width, depth, noise)``. Returns, per name, a
+    dict with ``metric`` and ``verdict`` at the preset, ``S1``, ``ST``,
+    ``mu_star``, ``sigma`` (arrays ordered as ``PARAMS``) and ``stability``
+    (share of the Sobol sample keeping the preset verdict).
+    """
+    sobol_unit = saltelli_design(n_sobol)
+    morris_unit, orders = morris_design(n_morris)
+    per_preset = 1 + len(sobol_unit) + len(morris_unit)
+
+    # One block of points per preset: the preset itself, the Sobol sample, the Morris trajectories
+    points = []
+    for width, depth, noise in presets.values():
+        lo, hi = neighbourhood(width, depth, noise, spread)
+        unit = np.concatenate([sobol_unit, morris_unit])
+        points += [[(width, depth, noise)], lo + unit * (hi - lo)]
+    points = np.concatenate(points)
+    metric = allostatic_metric(points[:, 0], points[:, 1], points[:, 2], steps, progress=progress)
+
+    results = {}
+    for b, name in enumerate(presets):
+        f = metric[b * per_preset:(b + 1) * per_preset]
+        f_center, f_sobol, f_morris = f[0], f[1:1 + len(sobol_unit)], f[1 + len(sobol_unit):]
+        S1, ST = sobol_indices(f_sobol, n_sobol)
+        mu_star, sigma = morris_indices(f_morris, orders, n_morris)
+        verdict = verdict_index(f_center)
+        results[name] = {
+            "metric": float(f_center),
+            "verdict": VERDICTS[verdict],
+            "S1": S1,
+            "ST": ST,
+            "mu_star": mu_star,
+            "sigma": sigma,
+            "stability": float(np.mean(verdict_index(f_sobol) == verdict)),
+        }
+    return results
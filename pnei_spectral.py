@@ -0,0 +1,172 @@
+"""
+Spectral analysis of PNEI trajectories (Welch PSD, band powers, 1/f slope).
+
+HRV and fNIRS are read in the frequency domain, so the trajectories are too.
+Everything works on whole ensembles in the engine layout (time along axis 0,
+paths along the others):
+
+- ``welch``: Hann-windowed, 50%-overlapping segments of every path are cut
+  with a strided view (no copy) and transformed by one ``np.fft.rfft`` call
+  along the last axis, then averaged over segments (one-sided PSD density);
+- ``band_powers``: integrated power in each band of ``BANDS``;
+- ``spectral_slope``: least-squares slope of log PSD vs log f, solved in
+  closed form for all paths at once (about -2 above the corner frequency of a
+  valley, 0 for white noise).
+
+Frequencies are in cycles per unit of model time (dt = 0.05, Nyquist 10).
+The bands keep the HRV names by analogy only: VLF holds the slow drift
+between wells, LF the relaxation within the valley (corner frequency
+depth / (2π width²)), HF the fast noise-driven jitter.
+
+``compare_cells`` runs every cell of the 3 × 3 design as one ensemble call
+(per-path parameter arrays) followed by one ``welch`` call.
+
+Usage:
+    python pnei_spectral.py                # band powers and slopes per design cell
+    python pnei_spectral.py --benchmark    # batched vs per-trajectory loop
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from pnei_engine import DISPLAY_DTYPE, DT, SEED, simulate_1d
+
+SEGMENT = 256
+OVERLAP = 0.5
+BLOCK_PATHS = 2048
+BANDS = {"VLF": (0.04, 0.2), "LF": (0.2, 1.0), "HF": (1.0, 4.0)}
+SLOPE_RANGE = (0.5, 5.0)
+BURN_IN = 100
+X0 = 1.5
+
+
+def welch(traj, dt=DT, segment=SEGMENT, overlap=OVERLAP, axis=0, block_paths=BLOCK_PATHS):
+    """
+    Welch power spectral density of every path of ``traj`` along ``axis``.
+
+    Returns ``(freqs, psd)`` with ``psd`` of shape ``traj.shape`` without
+    ``axis`` plus a trailing frequency axis. Paths are transformed in blocks
+    of ``block_paths`` to bound the complex temporaries.
+    """
+    x = np.moveaxis(np.asarray(traj), axis, -1)
+    segment = min(segment, x.shape[-1])
+    hop = max(1, int(segment * (1 - overlap)))
+    window = np.hanning(segment + 2)[1:-1]  # Hann window without its zero endpoints
+    scale = 2.0 * dt / np.sum(window**2)
+    freqs = np.fft.rfftfreq(segment, dt)
+
+    paths = x.reshape(-1, x.shape[-1])
+    psd = np.empty((len(paths), len(freqs)))
+    for start in range(0, len(paths), block_paths):
+        # (paths, segments, segment) strided view, one FFT for the whole block
+        segs = np.lib.stride_tricks.sliding_window_view(paths[start:start + block_paths], segment, axis=-1)[:, ::hop]
+        segs = segs - segs.mean(axis=-1, keepdims=True, dtype=np.float64)
+        spectrum = np.fft.rfft(segs * window, axis=-1)
+        psd[start:start + block_paths] = (spectrum.real**2 + spectrum.imag**2).mean(axis=1) * scale
+
+    # DC and Nyquist bins are not mirrored in the one-sided spectrum
+    psd[:, 0] /= 2
+    if segment % 2 == 0:
+        psd[:, -1] /= 2
+    return freqs, psd.reshape(x.shape[:-1] + (len(freqs),))
+
+
+def band_powers(freqs, psd, bands=BANDS):
+    """Power in each band (rectangle rule over the PSD bins), ``{name: array}``."""
+    df = freqs[1] - freqs[0]
+    return {name: psd[..., (freqs >= lo) & (freqs < hi)].sum(axis=-1) * df for name, (lo, hi) in bands.items()}
+
+
+def spectral_slope(freqs, psd, freq_range=SLOPE_RANGE):
+    """Slope of log10 PSD against log10 f inside ``freq_range``, for every path."""
+    lo, hi = freq_range
+    mask = (freqs >= lo) & (freqs <= hi)
+    log_f = np.log10(freqs[mask])
+    log_p = np.log10(np.maximum(psd[..., mask], np.finfo(float).tiny))
+    log_f = log_f - log_f.mean()
+    return ((log_p - log_p.mean(axis=-1, keepdims=True)) * log_f).sum(axis=-1) / np.sum(log_f**2)
+
+
+def compare_cells(steps, n_paths, burn_in=BURN_IN, seed=SEED, progress=None):
+    """
+    Spectra of every design cell, ``n_paths`` virtual participants each.
+
+    Returns ``(freqs, cells)`` where ``cells`` maps ``(profile, condition)``
+    to a dict with the ensemble-mean ``psd``, the mean ``bands`` powers and
+    the mean and SD of the ``slope``.
+    """
+    from pnei_design import CONDITIONS, PROFILES, get_interaction_params
+
+    names = [(profile, condition) for profile in PROFILES for condition in CONDITIONS]
+    params = np.array([get_interaction_params(*name)[:3] for name in names], dtype=np.float64)
+    width, depth, noise = np.repeat(params, n_paths, axis=0).T
+    traj = simulate_1d(width, depth, noise, steps, x0=X0, n_paths=len(width), seed=seed,
+                       dtype=DISPLAY_DTYPE, progress=progress)
+
+    freqs, psd = welch(traj[min(burn_in, steps // 2):])
+    psd = psd.reshape(len(names), n_paths, -1)
+    powers = band_powers(freqs, psd)
+    slope = spectral_slope(freqs, psd)
+    cells = {}
+    for c, name in enumerate(names):
+        cells[name] = {
+            "psd": psd[c].mean(axis=0),
+            "bands": {band: float(power[c].mean()) for band, power in powers.items()},
+            "slope": float(slope[c].mean()),
+            "slope_sd": float(slope[c].std()),
+        }
+    return freqs, cells
+
+
+def benchmark(steps=1000, paths=(100, 1000, 10000), repeats=3):
+    """Batched ``welch`` against a loop calling it on one trajectory at a time."""
+    print("=" * 60)
+    print("PNEI Waddington Simulator - Spectral Analysis Benchmark")
+    print("=" * 60)
+    print(f"\n{steps} steps, segments of {SEGMENT}, best of {repeats}\n")
+    print(f"{'Paths':>8}{'Loop':>12}{'Batched':>12}{'Speed-up':>12}")
+    print("-" * 60)
+    for n_paths in paths:
+        traj = simulate_1d(1.5, 1.5, 0.4, steps, x0=X0, n_paths=n_paths, dtype=DISPLAY_DTYPE)
+        timings = []
+        for run in (lambda: [welch(traj[:, i]) for i in range(n_paths)], lambda: welch(traj)):
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - start)
+            timings.append(best)
+        loop_psd = np.stack([welch(traj[:, i])[1] for i in range(n_paths)], axis=0)
+        assert np.allclose(loop_psd, welch(traj)[1])
+        print(f"{n_paths:>8,}{timings[0] * 1e3:>10.1f}ms{timings[1] * 1e3:>10.1f}ms{timings[0] / timings[1]:>11.1f}×")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spectral analysis of the PNEI design cells.")
+    parser.add_argument("--benchmark", action="store_true", help="time batched vs per-trajectory Welch")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--paths", type=int, default=200, help="virtual participants per cell")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.steps)
+        return 0
+
+    freqs, cells = compare_cells(args.steps, args.paths)
+    print("=" * 60)
+    print("PNEI Waddington Simulator - Spectral Signature per Design Cell")
+    print("=" * 60)
+    print(f"\n{args.paths} paths per cell, {args.steps} steps\n")
+    print(f"{'Population':<24}{'Environment':<22}" + "".join(f"{b:>10}" for b in BANDS) + f"{'LF/HF':>8}{'Slope':>15}")
+    print("-" * 60)
+    for (profile, condition), cell in cells.items():
+        powers = "".join(f"{p:>10.4f}" for p in cell["bands"].values())
+        ratio = cell["bands"]["LF"] / cell["bands"]["HF"]
+        print(f"{profile:<24}{condition:<22}{powers}{ratio:>8.2f}{cell['slope']:>8.2f} ± {cell['slope_sd']:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+Background simulation worker for the PNEI Waddington simulators.
+
+Streamlit runs each script top to bottom on the script thread, so a large
+ensemble used to freeze the page and a slider change had to wait for the
+previous run to finish. Here the expensive simulations run on a small thread
+pool (NumPy releases the GIL inside the vectorized ensemble updates):
+
+1. the script calls ``request(slot, fn, *args)``: the job for these arguments
+   is submitted (or joined, if already running or cached), and a job for
+   superseded arguments is cancelled;
+2. a new job gets ``SETTLE_TIME`` to finish before the script moves on, so
+   small ensembles are shown in the same run; otherwise the page renders
+   the last *completed* result of the slot right away;
+3. at the end of the script ``follow_all`` shows the progress of every
+   pending job, returns when they are done and reruns the script to show
+   them. A slider change during the wait interrupts the script at the next
+   progress update, so the new request is submitted immediately.
+
+Jobs receive a ``progress`` keyword, passed through to the engine integrators,
+which report after every block of steps and raise ``Cancelled`` once the job
+has been superseded. Completed results are kept in a small LRU shared by all
+sessions. ``PNEI_SYNC=1`` runs every job inline on the calling thread
+(deterministic, e.g. for headless runs).
+
+The module does not import Streamlit: ``slot`` is any mutable mapping (a
+dict in ``st.session_state``) and ``container`` any object with a
+``progress(value, text=...)`` method, such as ``st.empty()``.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+SYNC_ENV = "PNEI_SYNC"
+MAX_WORKERS = 2
+MAX_RESULTS = 16
+POLL_INTERVAL = 0.1
+SETTLE_TIME = 0.2    # a rerun re-sends every chart, far costlier than a short wait
+
+
+class Cancelled(Exception):
+    """Raised inside a job whose request has been superseded."""
+
+
+class Job:
+    """One simulation request: progress, cancellation flag and outcome."""
+
+    def __init__(self, key):
+        self.key = key
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def report(self, done_steps, steps):
+        """Engine ``progress`` callback: record progress, abort if cancelled."""
+        if self._cancel.is_set():
+            raise Cancelled(self.key)
+        self.progress = done_steps / steps
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+class SimulationWorker:
+    """Thread pool plus an LRU of completed results, keyed by job arguments."""
+
+    def __init__(self, max_workers=MAX_WORKERS, max_results=MAX_RESULTS, sync=None):
+        self.sync = os.environ.get(SYNC_ENV, "") not in ("", "0") if sync is None else sync
+        self.max_results = max_results
+        self._executor = None if self.sync else ThreadPoolExecutor(max_workers, thread_name_prefix="pnei-sim")
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._jobs = {}
+
+    def submit(self, key, fn, *args):
+        """Job computing ``fn(*args, progress=...)``, shared with identical pending requests."""
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                job = Job(key)
+                job.result = self._results[key]
+                job.progress = 1.0
+                job._done.set()
+                return job
+            job = self._jobs.get(key)
+            if job is None or job.cancelled:
+                job = self._jobs[key] = Job(key)
+                start = True
+            else:
+                start = False
+            job.waiters += 1
+
+        if start:
+            if self.sync:
+                self._run(job, fn, args)
+            else:
+                self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def release(self, job):
+        """Drop one waiter; the job is cancelled when nobody waits for it anymore."""
+        with self._lock:
+            job.waiters -= 1
+            if job.waiters <= 0 and not job.done:
+                job.cancel()
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+
+    def _run(self, job, fn, args):
+        try:
+            if job.cancelled:
+                raise Cancelled(job.key)
+            result = fn(*args, progress=job.report)
+        except Cancelled:
+            pass
+        except Exception as exc:  # surfaced on the script thread by request()
+            job.error = exc
+        else:
+            job.result, job.progress = result, 1.0
+            with self._lock:
+                self._results[job.key] = result
+                while len(self._results) > self.max_results:
+                    self._results.popitem(last=False)
+        finally:
+            with self._lock:
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+            job._done.set()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """Process-wide worker, created on first use (survives Streamlit reruns)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = SimulationWorker()
+        return _worker
+
+
+def request(slot, fn, *args):
+    """
+    Ask for ``fn(*args)`` in the background on behalf of ``slot``.
+
+    ``slot`` is a per-session mutable mapping holding the pending job and the
+    last completed result. A pending job for different arguments is released
+    (and cancelled if no other session waits for it). A newly submitted job
+    is given ``SETTLE_TIME`` seconds to complete. Returns
+    ``(result, pending)``: ``result`` is the last completed result of the
+    slot, or None if nothing has completed yet; ``pending`` is None when
+    ``result`` belongs to these arguments, else the job computing them (it
+    may complete while the page renders the stale result, so the caller must
+    still ``follow`` it and rerun).
+    """
+    key = (fn.__code__.co_filename, fn.__qualname__, args)
+    job = slot.get("job")
+    if job is None or job.key != key:
+        if job is not None:
+            get_worker().release(job)
+        job = slot["job"] = get_worker().submit(key, fn, *args)
+        job.wait(SETTLE_TIME)
+    if job.done:
+        if job.error is not None:
+            slot["job"] = None
+            raise job.error
+        if not job.cancelled:
+            slot["result"] = job.result
+        return slot.get("result"), None
+    return slot.get("result"), job
+
+
+def discard(slot):
+    """Release the pending job of ``slot`` when its view is no longer shown."""
+    job = slot.pop("job", None)
+    if job is not None:
+        get_worker().release(job)
+
+
+def follow(job, container, text="Simulating…"):
+    """Show the progress of ``job`` in ``container`` until it is done."""
+    while not job.wait(POLL_INTERVAL):
+        container.progress(job.progress, text=f"{text} {job.progress:.0%}")
+    container.empty()
+
+
+def follow_all(pending, rerun):
+    """
+    Wait for the pending jobs at the very end of the script, then ``rerun``.
+
+    ``pending`` holds ``(job, container, text)`` triples, ``job`` None when
+    nothing is pending. The page has already been rendered; moving a slider
+    meanwhile interrupts the wait and supersedes the jobs.
+    """
+    pending = [item for item in pending if item[0] is not None]
+    for job, container, text in pending:
+        follow(job, container, text)
+    if pending:
+        rerun()